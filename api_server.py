@@ -186,7 +186,8 @@ def root():
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", "search_cache": mcp.search_cache_info(),
+            "page_text_cache": mcp.page_text_cache_info()}
 
 
 # ============== MCP JSON-RPC Protocol ==============
@@ -3,11 +3,30 @@
 Canadian Building Code MCP Server
 """
 
+import asyncio
 import json
 import hashlib
+import heapq
+import math
+import mmap
+import multiprocessing
+import os
+import queue
+import re
+import struct
 import sys
+import time
+import threading
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Callable, FrozenSet, Iterator, NamedTuple, Sequence
 
 from mcp.server import Server
 from mcp.types import (
@@ -19,7 +38,12 @@ from mcp.server.stdio import stdio_server
 
 # For PDF text extraction (BYOD mode)
 try:
-    import fitz  # PyMuPDF
+    # The legacy "fitz" name prints a deprecation notice on stdout, which is
+    # the JSON-RPC pipe, so prefer the "pymupdf" name newer releases provide
+    try:
+        import pymupdf as fitz  # PyMuPDF
+    except ImportError:
+        import fitz  # PyMuPDF
     PYMUPDF_AVAILABLE = True
 except ImportError:
     PYMUPDF_AVAILABLE = False
@@ -31,6 +55,13 @@ try:
 except ImportError:
     FUZZY_AVAILABLE = False
 
+# For vectorized search scoring (optional; pure-Python scoring otherwise)
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
 
 # ============================================
 # LOGGING - stderr output for MCP Inspector
@@ -258,29 +289,1767 @@ DISCLAIMER = "This tool provides references only. Verify with official documents
 # OFC is now indexed in maps/OFC.json - searchable!
 WEB_REFERENCE_CODES = {}
 
+# Division prefixes that section IDs carry in the maps (e.g. "B-9.10.14.1")
+DIVISION_PREFIXES = ('A-', 'B-', 'C-')
+
+# search_code ranking modes. "bm25" scores term matches with BM25F over the
+# title and keyword fields; a title hit counts double a keyword hit.
+RANKING_MODES = ("default", "bm25")
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_FIELD_WEIGHTS = {"title": 2.0, "keywords": 1.0}
+
+# search_code match types, in the order the vectorized scorer codes them
+MATCH_TYPES = ("exact_id", "exact", "synonym", "fuzzy")
+
+# search_code scopes: "map" searches section titles and keywords; "fulltext"
+# searches the text of connected PDFs through their full-text indexes
+SEARCH_SCOPES = ("map", "fulltext")
+
+# Ranked search_code results kept for repeated queries
+SEARCH_CACHE_SIZE = 256
+
+# Memory budget for extracted PDF page text shared by the BYOD readers
+PAGE_TEXT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def _parent_from_id(section_id: str) -> Optional[str]:
+    """Parent ID by dropping the last dotted component ("9.10.14" -> "9.10")."""
+    parts = section_id.split(".")
+    return ".".join(parts[:-1]) if len(parts) > 1 else None
+
+
+def _table_key(table_id: str) -> str:
+    """Normalize a table ID for lookup: "Table 9.10.14.4.-A" -> "9.10.14.4-a"."""
+    key = table_id.strip().lower()
+    key = re.sub(r"^(table[\s-]*)+", "", key)
+    key = re.sub(r"\s*-\s*", "-", key)
+    key = re.sub(r"\.(?=-|$)", "", key)
+    return key
+
+
+class _SectionRecord(NamedTuple):
+    """Normalized search terms for one section (see _CodeIndex.record)."""
+    keywords: FrozenSet[str]     # lowercase keywords
+    title_terms: FrozenSet[str]  # lowercase whitespace-split title words
+    terms: FrozenSet[str]        # keywords | title_terms
+    id_lower: str
+    is_table: bool
+    doc_type: str
+
+
+class _LRUCache:
+    """Bounded least-recently-used cache with hit/miss counters.
+
+    maxsize bounds the number of entries or, given weigh, the total weight
+    of the cached values (e.g. bytes).
+    """
+
+    def __init__(self, maxsize: int, weigh: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._weigh = weigh
+        self._weight = 0
+        self._data: OrderedDict = OrderedDict()  # key -> (value, weight)
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Any:
+        """Cached value for key (None on a miss), marking it most recently used."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        weight = self._weigh(value) if self._weigh else 1
+        if weight > self.maxsize:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._weight -= old[1]
+            self._data[key] = (value, weight)
+            self._weight += weight
+            while self._weight > self.maxsize:
+                self._weight -= self._data.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            info = {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                    "size": len(self._data), "maxsize": self.maxsize}
+            if self._weigh:
+                info["weight"] = self._weight
+            return info
+
+
+class _NgramIndex:
+    """Character trigram index over a term vocabulary.
+
+    Finds the terms sharing the most trigrams with the query, a short
+    candidate list whose fuzzy scores bound a nearest-term lookup over the
+    whole vocabulary.
+    """
+
+    def __init__(self, terms: List[str]):
+        self.terms = terms
+        self.grams: Dict[str, List[int]] = {}
+        for i, term in enumerate(terms):
+            for gram in self._grams(term):
+                self.grams.setdefault(gram, []).append(i)
+
+    @staticmethod
+    def _grams(term: str) -> set:
+        padded = f"  {term} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def candidates(self, query: str, limit: int = 200) -> List[str]:
+        """Return up to limit terms, most shared trigrams first."""
+        counts = Counter()
+        for gram in self._grams(query):
+            counts.update(self.grams.get(gram, ()))
+        return [self.terms[i] for i, _ in counts.most_common(limit)]
+
+
+class _TermTable:
+    """Global term dictionary: each keyword and title word gets one small integer ID.
+
+    Shared by every code, so a term is stored once however many sections use
+    it, and per-section term lists are arrays of IDs. IDs are append-only:
+    a code indexed from its JSON interns any new terms at the end.
+    """
+
+    def __init__(self, terms: Sequence[str] = ()):
+        self.terms: List[str] = [sys.intern(term) for term in terms]
+        self.ids: Dict[str, int] = {term: i for i, term in enumerate(self.terms)}
+
+    def intern(self, term: str) -> int:
+        tid = self.ids.get(term)
+        if tid is None:
+            tid = self.ids[term] = len(self.terms)
+            self.terms.append(sys.intern(term))
+        return tid
+
+
+def _id_typecode(max_value: int) -> str:
+    """Smallest unsigned array typecode for IDs up to max_value ("H" = 16-bit)."""
+    return "H" if max_value <= 0xFFFF else "I"
+
+
+class _IndexColumns(NamedTuple):
+    """Flat arrays behind a _CodeIndex, computed from a map or read from the index file.
+
+    Term IDs refer to the global _TermTable. Each *_starts array delimits,
+    per term or per section, a run of the matching *_items array (CSR layout).
+    """
+    post_starts: Sequence[int]     # term ID -> run of post_items (IDs past the end: none)
+    post_items: Sequence[int]      # section positions, ascending per term
+    kw_starts: Sequence[int]       # section -> run of kw_items
+    kw_items: Sequence[int]        # keyword term IDs, in the map's keyword order
+    title_starts: Sequence[int]    # section -> run of title_items
+    title_items: Sequence[int]     # title word term IDs
+    ids: List[str]                 # section IDs
+    parent_ids: List[str]          # parent section IDs ("" = none)
+    is_table: Sequence[int]        # 1 for table sections
+    table_ids: List[str]           # IDs of the map's tables
+    titles: Sequence[str]
+    levels: Sequence[str]          # "" = none
+    types: Sequence[str]           # "" = none
+    pages: Sequence[int]           # -1 = none
+    page_ends: Sequence[int]       # -1 = none
+    bboxes: Sequence[float]        # l, t, r, b per section (NaN = no bbox)
+    bbox_origins: Sequence[str]
+    tables: Sequence[Dict]         # table dicts (with markdown)
+
+
+def _index_columns(data: Dict, table: _TermTable) -> _IndexColumns:
+    """Compute the index columns for one parsed map, interning its terms into table."""
+    sections = data.get("sections", [])
+    keyword_ids = []
+    title_ids = []
+    for s in sections:
+        keywords = dict.fromkeys(kw.lower() for kw in s.get("keywords", []))
+        keyword_ids.append([table.intern(term) for term in keywords])
+        title_ids.append(sorted({table.intern(term) for term in s.get("title", "").lower().split()}))
+
+    term_code = _id_typecode(len(table.terms) - 1)
+    postings: Dict[int, array] = {}
+    kw_starts, kw_items = array("I", [0]), array(term_code)
+    title_starts, title_items = array("I", [0]), array(term_code)
+    for idx, (keywords, title_terms) in enumerate(zip(keyword_ids, title_ids)):
+        kw_items.extend(keywords)
+        kw_starts.append(len(kw_items))
+        title_items.extend(title_terms)
+        title_starts.append(len(title_items))
+        for tid in set(keywords).union(title_terms):
+            postings.setdefault(tid, array(_id_typecode(len(sections)))).append(idx)
+
+    post_starts, post_items = array("I", [0]), array(_id_typecode(len(sections)))
+    for tid in range(max(postings, default=-1) + 1):
+        post_items.extend(postings.get(tid, ()))
+        post_starts.append(len(post_items))
+
+    return _IndexColumns(
+        post_starts=post_starts,
+        post_items=post_items,
+        kw_starts=kw_starts,
+        kw_items=kw_items,
+        title_starts=title_starts,
+        title_items=title_items,
+        ids=[s.get("id", "") for s in sections],
+        parent_ids=[s.get("parent_id") or _parent_from_id(s.get("id", "")) or "" for s in sections],
+        is_table=bytes(s.get("type") == "table" for s in sections),
+        table_ids=[table.get("id", "") for table in data.get("tables", [])],
+        titles=[s.get("title", "") for s in sections],
+        levels=[s.get("level") or "" for s in sections],
+        types=[s.get("type") or "" for s in sections],
+        pages=array("i", (-1 if s.get("page") is None else s["page"] for s in sections)),
+        page_ends=array("i", (-1 if s.get("page_end") is None else s["page_end"] for s in sections)),
+        bboxes=array("d", (v for s in sections for v in _bbox_values(s.get("bbox")))),
+        bbox_origins=[(s.get("bbox") or {}).get("coord_origin", "") for s in sections],
+        tables=data.get("tables", []),
+    )
+
+
+def _bbox_values(bbox: Optional[Dict]) -> tuple:
+    if not bbox:
+        return (math.nan,) * 4
+    return (bbox["l"], bbox["t"], bbox["r"], bbox["b"])
+
+
+class _Section:
+    """One section, read back from the index columns (see _CodeIndex.section)."""
+    __slots__ = ("id", "title", "page", "page_end", "level", "type", "bbox", "keywords")
+
+    def __init__(self, section_id: str, title: str, page: Optional[int], page_end: Optional[int],
+                 level: str, section_type: str, bbox: Optional[Dict], keywords: List[str]):
+        self.id = section_id
+        self.title = title
+        self.page = page
+        self.page_end = page_end
+        self.level = level
+        self.type = section_type
+        self.bbox = bbox
+        self.keywords = keywords
+
+
+class _TextColumn(Sequence):
+    """Strings stored as a u32 offset table over UTF-8 bytes, decoded per access."""
+
+    def __init__(self, offsets: Sequence[int], data: memoryview):
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return str(self._data[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+
+class _RecordView(Sequence):
+    """Dicts stored as one JSON document each in a _TextColumn, decoded per access.
+
+    Nothing is cached, so the records stay in the (shared, memory-mapped)
+    index file rather than becoming per-process Python objects.
+    """
+
+    def __init__(self, text: _TextColumn):
+        self._text = text
+
+    def __len__(self) -> int:
+        return len(self._text)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [json.loads(text) for text in self._text[i]]
+        return json.loads(self._text[i])
+
+
+class _Postings(Mapping):
+    """Term -> positions of the sections containing it, over CSR arrays."""
+
+    def __init__(self, table: _TermTable, starts: Sequence[int], items: Sequence[int]):
+        self._table = table
+        self._starts = starts
+        self._items = memoryview(items)  # slices share the buffer
+
+    def run(self, tid: int) -> memoryview:
+        """Positions for a term ID (empty if no section here has the term)."""
+        if tid + 1 >= len(self._starts):
+            return self._items[:0]
+        return self._items[self._starts[tid]:self._starts[tid + 1]]
+
+    def __getitem__(self, term: str) -> memoryview:
+        run = self.run(self._table.ids[term])
+        if not run:
+            raise KeyError(term)
+        return run
+
+    def __iter__(self) -> Iterator[str]:
+        starts = self._starts
+        for tid in range(len(starts) - 1):
+            if starts[tid] != starts[tid + 1]:
+                yield self._table.terms[tid]
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class _CodeIndex:
+    """Inverted term index over one code's sections.
+
+    Built from index columns (computed from the map JSON, or read from the
+    prebuilt index file) so a search only visits sections that share a term
+    with the query instead of scanning the whole map.
+    """
+
+    def __init__(self, columns: _IndexColumns, doc_type: str, table: _TermTable):
+        self.columns = columns
+        self.doc_type = doc_type
+        self.tables = columns.tables  # with markdown
+        self.terms = table.terms
+        self.postings = _Postings(table, columns.post_starts, columns.post_items)
+        self.is_table = columns.is_table
+        # Sorted unique keywords, for suggestions
+        self.keywords = sorted(self.terms[t] for t in set(columns.kw_items))
+
+        # Section IDs joined into one string so substring ID matches run as
+        # str.find over the blob rather than a Python loop over every section
+        self.ids = columns.ids
+        self.ids_lower = [sid.lower() for sid in self.ids]
+        self._id_blob = "\n".join(self.ids_lower)
+        self._id_starts: List[int] = []
+        offset = 0
+        for sid in self.ids_lower:
+            self._id_starts.append(offset)
+            offset += len(sid) + 1
+
+        # Section ID -> position (first occurrence wins, as in a document-order
+        # scan), plus the same keyed without the Division prefix so that
+        # "9.10.14.1" resolves to "B-9.10.14.1" in one probe
+        self.by_id: Dict[str, int] = {}
+        self.by_bare_id: Dict[str, int] = {}
+        for idx, sid in enumerate(self.ids):
+            self.by_id.setdefault(sid, idx)
+            if sid.startswith(DIVISION_PREFIXES):
+                self.by_bare_id.setdefault(sid[2:], idx)
+        self._sorted_ids = sorted((sid, idx) for sid, idx in self.by_id.items())
+
+        # Hierarchy tree: each section's parent ID (the parent_id field, else
+        # parsed from the ID string) and, per parent ID, the child positions
+        # in document order. Parents missing from the map still get an entry.
+        self.parent_ids: List[Optional[str]] = [pid or None for pid in columns.parent_ids]
+        self.children: Dict[str, array] = {}
+        for idx, parent_id in enumerate(self.parent_ids):
+            if parent_id:
+                self.children.setdefault(parent_id, array("i")).append(idx)
+
+        # Table IDs sorted by normalized form, for prefix listing
+        self.table_keys = sorted((_table_key(table_id), idx)
+                                 for idx, table_id in enumerate(columns.table_ids))
+
+        # BM25 collection statistics. Document frequencies are the posting run
+        # lengths; the average field lengths come from the CSR offsets.
+        count = len(self.ids) or 1
+        self.avg_title_len = (columns.title_starts[-1] / count) or 1.0
+        self.avg_keywords_len = (columns.kw_starts[-1] / count) or 1.0
+        self._idf: Dict[int, float] = {}
+
+    def section(self, idx: int) -> _Section:
+        """Materialize one section from the columns."""
+        c = self.columns
+        page = c.pages[idx]
+        page_end = c.page_ends[idx]
+        left, top, right, bottom = c.bboxes[4 * idx:4 * idx + 4]
+        bbox = None
+        if not math.isnan(left):
+            bbox = {"l": left, "t": top, "r": right, "b": bottom, "coord_origin": c.bbox_origins[idx]}
+        return _Section(
+            section_id=self.ids[idx],
+            title=c.titles[idx],
+            page=None if page == -1 else page,
+            page_end=None if page_end == -1 else page_end,
+            level=c.levels[idx],
+            section_type=c.types[idx],
+            bbox=bbox,
+            keywords=[self.terms[t] for t in c.kw_items[c.kw_starts[idx]:c.kw_starts[idx + 1]]],
+        )
+
+    def record(self, idx: int) -> _SectionRecord:
+        """Normalized search terms of one section."""
+        c = self.columns
+        keywords = frozenset(self.terms[t] for t in c.kw_items[c.kw_starts[idx]:c.kw_starts[idx + 1]])
+        title_terms = frozenset(self.terms[t] for t in c.title_items[c.title_starts[idx]:c.title_starts[idx + 1]])
+        return _SectionRecord(
+            keywords=keywords,
+            title_terms=title_terms,
+            terms=keywords | title_terms,
+            id_lower=self.ids_lower[idx],
+            is_table=bool(self.is_table[idx]),
+            doc_type=self.doc_type,
+        )
+
+    def idf(self, tid: int) -> float:
+        """BM25 inverse document frequency of a term within this code, memoized on first use."""
+        idf = self._idf.get(tid)
+        if idf is None:
+            count = len(self.ids)
+            df = len(self.postings.run(tid))
+            idf = self._idf[tid] = math.log(1.0 + (count - df + 0.5) / (df + 0.5))
+        return idf
+
+    def bm25(self, idx: int, tid: int) -> float:
+        """BM25F contribution of one term to one section (title + keyword fields)."""
+        c = self.columns
+        tf = 0.0
+        start, end = c.title_starts[idx], c.title_starts[idx + 1]
+        if tid in c.title_items[start:end]:
+            norm = 1.0 - BM25_B + BM25_B * (end - start) / self.avg_title_len
+            tf += BM25_FIELD_WEIGHTS["title"] / norm
+        start, end = c.kw_starts[idx], c.kw_starts[idx + 1]
+        if tid in c.kw_items[start:end]:
+            norm = 1.0 - BM25_B + BM25_B * (end - start) / self.avg_keywords_len
+            tf += BM25_FIELD_WEIGHTS["keywords"] / norm
+        return self.idf(tid) * tf * (BM25_K1 + 1.0) / (tf + BM25_K1)
+
+    def find(self, section_id: str) -> Optional[int]:
+        """Resolve a section ID to its position, auto-detecting the Division prefix."""
+        idx = self.by_id.get(section_id)
+        if not section_id.startswith(DIVISION_PREFIXES + ('Commentary-', 'Part')):
+            bare_idx = self.by_bare_id.get(section_id)
+            if bare_idx is not None and (idx is None or bare_idx < idx):
+                idx = bare_idx
+        return idx
+
+    def ids_with_prefix(self, prefix: str, limit: int) -> List[str]:
+        """Return up to limit section IDs starting with prefix, in document order."""
+        start = bisect_right(self._sorted_ids, (prefix,))
+        hits = []
+        for sid, idx in self._sorted_ids[start:]:
+            if not sid.startswith(prefix):
+                break
+            hits.append(idx)
+        return [self.ids[idx] for idx in sorted(hits)[:limit]]
+
+    def lookup(self, terms: set) -> set:
+        """Return positions of sections containing any of the given terms."""
+        matched = set()
+        for term in terms:
+            matched.update(self.postings.get(term, ()))
+        return matched
+
+    def match_ids(self, needle: str) -> List[int]:
+        """Return positions of sections whose lowercase ID contains needle."""
+        if not needle or "\n" in needle:
+            return []
+        # The needle has no newline, so a hit never spans two IDs
+        found = []
+        pos = self._id_blob.find(needle)
+        while pos != -1:
+            idx = bisect_right(self._id_starts, pos) - 1
+            found.append(idx)
+            if idx + 1 >= len(self._id_starts):
+                break
+            # One hit per section is enough; resume at the next ID
+            pos = self._id_blob.find(needle, self._id_starts[idx + 1])
+        return found
+
+    def tables_with_prefix(self, prefix: str) -> List[int]:
+        """Return positions of tables whose normalized ID starts with prefix."""
+        start = bisect_right(self.table_keys, (prefix,))
+        hits = []
+        for key, idx in self.table_keys[start:]:
+            if not key.startswith(prefix):
+                break
+            hits.append(idx)
+        return hits
+
+
+def _python_candidates(indexes: List[_CodeIndex], query_lower: str, query_terms: set, expanded_count: int,
+                       query_ids: set, expanded_ids: set, fuzzy_matches: Dict[str, Dict[int, float]],
+                       bm25: bool) -> tuple:
+    """Pure-Python scores for every matching section; returns (candidates, total matches).
+
+    Candidates are (score, code order, position, match type) tuples. Used
+    for BM25 ranking, and for the default ranking when NumPy is missing.
+    """
+    scored = []
+    for code_rank, index in enumerate(indexes):
+        ids_lower = index.ids_lower
+
+        # 1. Section ID exact/partial match (highest priority)
+        id_hits = set(index.match_ids(query_lower))
+        for idx in id_hits:
+            score = 2.0 if ids_lower[idx].endswith(query_lower) else 1.5
+            scored.append((score, code_rank, idx, "exact_id"))
+
+        # 2. Exact keyword/title word matches (including synonyms); counting
+        #    posting hits per section gives how many expanded (and original)
+        #    query terms it contains without visiting any other section
+        matched = Counter()
+        original = Counter()
+        for tid in expanded_ids:
+            hits = index.postings.run(tid)
+            matched.update(hits)
+            if tid in query_ids:
+                original.update(hits)
+        term_hits = matched.keys() - id_hits
+        if bm25:
+            # Sum each matched term's BM25F contribution; synonyms count 0.9x
+            bm25_scores: Dict[int, float] = {}
+            for tid in expanded_ids:
+                weight = 1.0 if tid in query_ids else 0.9
+                for idx in index.postings.run(tid):
+                    if idx in term_hits:
+                        bm25_scores[idx] = bm25_scores.get(idx, 0.0) + weight * index.bm25(idx, tid)
+            for idx, score in bm25_scores.items():
+                scored.append((score, code_rank, idx, "exact" if original.get(idx) else "synonym"))
+            term_hits = bm25_scores.keys()
+        else:
+            for idx in term_hits:
+                # Boost if original terms matched (not just synonyms)
+                original_matches = original.get(idx)
+                if original_matches:
+                    score = original_matches / len(query_terms)
+                    scored.append((score, code_rank, idx, "exact"))
+                else:
+                    # Synonym match - slightly lower score
+                    score = (matched[idx] / expanded_count) * 0.9
+                    scored.append((score, code_rank, idx, "synonym"))
+
+        # 3. Fuzzy matching (typo tolerance) - only if no exact match.
+        #    Each section keeps its best vocabulary match per query term.
+        best_fuzzy: Dict[int, Dict[str, tuple]] = {}
+        for term, vocab_matches in fuzzy_matches.items():
+            for tid, fscore in vocab_matches.items():
+                for idx in index.postings.run(tid):
+                    if idx in id_hits or idx in term_hits:
+                        continue
+                    section_best = best_fuzzy.setdefault(idx, {})
+                    if fscore > section_best.get(term, (0.0,))[0]:
+                        section_best[term] = (fscore, tid)
+
+        for idx, section_best in best_fuzzy.items():
+            if bm25:
+                # BM25F of the matched vocabulary terms, scaled by similarity
+                score = sum(0.8 * fscore * index.bm25(idx, tid)
+                            for fscore, tid in section_best.values())
+            else:
+                fuzzy_total = sum(section_best[term][0] for term in query_terms if term in section_best)
+                score = (fuzzy_total / len(query_terms)) * 0.8  # Fuzzy gets lower weight
+            scored.append((score, code_rank, idx, "fuzzy"))
+    return scored, len(scored)
+
+
+def _vector_candidates(indexes: List[_CodeIndex], query_lower: str, query_count: int,
+                       expanded_count: int, query_ids: set, expanded_ids: set,
+                       fuzzy_matches: Dict[str, Dict[int, float]], limit: int) -> tuple:
+    """Default-ranking scores with NumPy; returns (best candidates, total matches).
+
+    A code's postings are the CSR arrays of its term-by-section incidence
+    matrix, so each query term adds its run to per-section hit counts and
+    the scores follow as array operations. The best `limit` candidates are
+    chosen with argpartition and returned as (score, code order, position,
+    match type) tuples, the same as _python_candidates produces.
+    """
+    if not indexes:
+        return [], 0
+    keys, ranks, positions, scores, kinds = [], [], [], [], []
+    for code_rank, index in enumerate(indexes):
+        count = len(index.ids)
+        score = np.zeros(count)
+        kind = np.full(count, -1, np.int8)
+
+        # 1. Section ID exact/partial match (highest priority)
+        id_hits = index.match_ids(query_lower)
+        for idx in id_hits:
+            score[idx] = 2.0 if index.ids_lower[idx].endswith(query_lower) else 1.5
+        kind[id_hits] = 0
+
+        # 2. Exact keyword/title word matches (including synonyms)
+        matched = np.zeros(count, np.int32)
+        original = np.zeros(count, np.int32)
+        for tid in expanded_ids:
+            hits = np.asarray(index.postings.run(tid))
+            matched[hits] += 1
+            if tid in query_ids:
+                original[hits] += 1
+        exact = (kind < 0) & (original > 0)
+        synonym = (kind < 0) & (matched > 0) & ~exact
+        score[exact] = original[exact] / query_count
+        score[synonym] = matched[synonym] / expanded_count * 0.9
+        kind[exact] = 1
+        kind[synonym] = 2
+
+        # 3. Fuzzy matching - best vocabulary match per query term, only
+        #    for sections without an exact match
+        if fuzzy_matches:
+            fuzzy_total = np.zeros(count)
+            reached = np.zeros(count, bool)
+            for vocab_matches in fuzzy_matches.values():
+                best = np.zeros(count)
+                for tid, fscore in vocab_matches.items():
+                    hits = np.asarray(index.postings.run(tid))
+                    best[hits] = np.maximum(best[hits], fscore)
+                    reached[hits] = True
+                fuzzy_total += best
+            fuzzy = (kind < 0) & reached
+            score[fuzzy] = fuzzy_total[fuzzy] / query_count * 0.8
+            kind[fuzzy] = 3
+
+        found = np.flatnonzero(kind >= 0)
+        # Ranked as in search_code: ID matches first, then the table-boosted
+        # score rounded to 3 places
+        boosted = score[found] + 0.01 * np.frombuffer(index.is_table, np.uint8)[found]
+        keys.append(np.where(kind[found] == 0, 0.0, 100.0) - np.round(boosted, 3))
+        ranks.append(np.full(len(found), code_rank))
+        positions.append(found)
+        scores.append(score[found])
+        kinds.append(kind[found])
+
+    keys = np.concatenate(keys)
+    total = len(keys)
+    if total > limit:
+        # Everything tied with the k-th best key stays in, so that document
+        # order decides among equal scores
+        kth = keys[np.argpartition(keys, limit - 1)[:limit]].max()
+        chosen = np.flatnonzero(keys <= kth)
+    else:
+        chosen = np.arange(total)
+    ranks, positions = np.concatenate(ranks)[chosen], np.concatenate(positions)[chosen]
+    order = np.lexsort((positions, ranks, keys[chosen]))[:limit]
+    scores, kinds = np.concatenate(scores)[chosen], np.concatenate(kinds)[chosen]
+    return [(float(scores[i]), int(ranks[i]), int(positions[i]), MATCH_TYPES[kinds[i]])
+            for i in order], total
+
+
+# Map manifest: per-map metadata (code, version, section count, table IDs)
+# so the server can start without parsing every map. Regenerate with
+# scripts/build_map_manifest.py after changing maps/*.json.
+MAP_MANIFEST = "_manifest.json"
+MAP_MANIFEST_FORMAT = 2
+
+
+def _map_summary(data: Dict, json_file: Path) -> Dict:
+    """Manifest entry for one parsed map file."""
+    sections = data.get("sections", [])
+    summary = {"size": json_file.stat().st_size, "md5": _file_md5(json_file)}
+    for field in ("code", "version", "document_type"):
+        if field in data:
+            summary[field] = data[field]
+    summary["sections"] = len(sections)
+    summary["max_page"] = max((s.get("page", 0) for s in sections), default=0)
+    summary["tables"] = [table.get("id", "") for table in data.get("tables", [])]
+    return summary
+
+
+def _read_map_file(json_file: Path) -> Optional[Dict]:
+    """Parse one map JSON file; None if it is missing or malformed."""
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _map_files(maps_dir: Path) -> List[Path]:
+    """Map JSON files in maps_dir (the manifest and other _-prefixed files excluded)."""
+    return [f for f in maps_dir.glob("*.json") if not f.name.startswith("_")]
+
+
+def build_map_manifest(maps_dir: str = "maps") -> Path:
+    """Write the map manifest for maps_dir and return its path."""
+    maps_path = Path(maps_dir)
+    entries = {}
+    for json_file in sorted(_map_files(maps_path)):
+        data = _read_map_file(json_file)
+        if data is not None:
+            entries[json_file.name] = _map_summary(data, json_file)
+    manifest_file = maps_path / MAP_MANIFEST
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump({"format": MAP_MANIFEST_FORMAT, "maps": entries}, f, ensure_ascii=False, indent=1)
+        f.write("\n")
+    return manifest_file
+
+
+class _MapRegistry(Mapping):
+    """Code -> map data, parsed on first access.
+
+    Codes are registered by file at startup, so membership tests, iteration
+    and len() never read a map; indexing a code parses its file once.
+    """
+
+    def __init__(self, loader: Callable[[str, Path], Dict]):
+        self._loader = loader
+        self._files: Dict[str, Path] = {}
+        self._loaded: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def register(self, code: str, json_file: Path, data: Optional[Dict] = None):
+        self._files[code] = json_file
+        if data is not None:
+            self._loaded[code] = data
+
+    def is_loaded(self, code: str) -> bool:
+        return code in self._loaded
+
+    def path(self, code: str) -> Path:
+        return self._files[code]
+
+    def read(self, code: str) -> Dict:
+        """Map data for code, without keeping it if it wasn't loaded already."""
+        data = self._loaded.get(code)
+        return data if data is not None else self._loader(code, self._files[code])
+
+    def __getitem__(self, code: str) -> Dict:
+        data = self._loaded.get(code)
+        if data is None:
+            json_file = self._files[code]  # KeyError for unknown codes
+            with self._lock:  # tool calls run on worker threads; parse once
+                data = self._loaded.get(code)
+                if data is None:
+                    data = self._loaded[code] = self._loader(code, json_file)
+        return data
+
+    def __contains__(self, code) -> bool:
+        return code in self._files
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._files)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+
+# Prebuilt search index: every code's index columns in one binary file that
+# is memory-mapped at startup instead of rebuilding the indexes from JSON.
+# Regenerate with scripts/build_search_index.py after changing maps/*.json.
+#
+# Layout: magic, u32 header length, JSON header, then 8-byte aligned column
+# blocks: the global term table, then each code's columns. The header gives
+# every block's offset, length, item count and typecode. Numeric columns are
+# little-endian arrays (term and section IDs 16-bit where they fit); string
+# columns are UTF-8
+# joined with newlines (decoded whole); text columns are a u32 offset table
+# plus UTF-8 (decoded per item); record columns are text columns of JSON.
+# Section fields and tables stay in the mapped file, so processes serving
+# the same file (e.g. uvicorn workers) share them through the page cache. The
+# header records each code's map file and MD5 so a column set is only used
+# while its map is unchanged.
+SEARCH_INDEX = "search_index.bin"
+SEARCH_INDEX_MAGIC = b"BCMIDX01"
+SEARCH_INDEX_FORMAT = 4
+# Column name -> array typecode ("s" = string, "t" = text, "j" = record column);
+# array columns keep the typecode they were built with
+_INDEX_COLUMN_TYPES = {
+    "post_starts": "I",
+    "post_items": "I",
+    "kw_starts": "I",
+    "kw_items": "I",
+    "title_starts": "I",
+    "title_items": "I",
+    "ids": "s",
+    "parent_ids": "s",
+    "is_table": "B",
+    "table_ids": "s",
+    "titles": "t",
+    "levels": "t",
+    "types": "t",
+    "pages": "i",
+    "page_ends": "i",
+    "bboxes": "d",
+    "bbox_origins": "t",
+    "tables": "j",
+}
+
+
+def _file_md5(path: Path) -> str:
+    """Calculate MD5 hash of a file."""
+    hash_md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def _pack_column(kind: str, values: Sequence) -> bytes:
+    """Serialize one index column."""
+    if kind == "s":
+        if any("\n" in value for value in values):
+            raise ValueError("string column values cannot contain newlines")
+        return "\n".join(values).encode("utf-8")
+    if kind in ("t", "j"):
+        if kind == "j":
+            values = [json.dumps(value, ensure_ascii=False, separators=(",", ":")) for value in values]
+        encoded = [value.encode("utf-8") for value in values]
+        offsets = array("I", [0])
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        return _pack_column("I", offsets) + b"".join(encoded)
+    packed = array(kind, values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def build_search_index(maps_dir: str = "maps") -> Path:
+    """Write the prebuilt search index for maps_dir and return its path."""
+    maps_path = Path(maps_dir)
+    maps = []
+    for json_file in sorted(_map_files(maps_path)):
+        data = _read_map_file(json_file)
+        if data is not None:
+            maps.append((json_file, data))
+
+    # Term IDs in sorted term order across all codes
+    terms = set()
+    for _, data in maps:
+        for s in data.get("sections", []):
+            terms.update(kw.lower() for kw in s.get("keywords", []))
+            terms.update(s.get("title", "").lower().split())
+    table = _TermTable(sorted(terms))
+
+    blocks = []
+    offset = 0
+
+    def add_block(kind: str, values: Sequence) -> list:
+        nonlocal offset
+        kind = getattr(values, "typecode", kind)
+        block = _pack_column(kind, values)
+        entry = [offset, len(block), len(values), kind]
+        block += b"\0" * (-len(block) % 8)
+        blocks.append(block)
+        offset += len(block)
+        return entry
+
+    header = {"format": SEARCH_INDEX_FORMAT, "terms": add_block("s", table.terms), "codes": {}}
+    for json_file, data in maps:
+        columns = _index_columns(data, table)
+        header["codes"][data.get("code", json_file.stem)] = {
+            "file": json_file.name,
+            "size": json_file.stat().st_size,
+            "md5": _file_md5(json_file),
+            "columns": {name: add_block(kind, getattr(columns, name))
+                        for name, kind in _INDEX_COLUMN_TYPES.items()},
+        }
+
+    encoded = json.dumps(header).encode("utf-8")
+    encoded += b" " * (-(len(SEARCH_INDEX_MAGIC) + 4 + len(encoded)) % 8)
+    index_file = maps_path / SEARCH_INDEX
+    with open(index_file, "wb") as f:
+        f.write(SEARCH_INDEX_MAGIC)
+        f.write(len(encoded).to_bytes(4, "little"))
+        f.write(encoded)
+        for block in blocks:
+            f.write(block)
+    return index_file
+
+
+class _SearchIndexFile:
+    """Read-only, memory-mapped view of the prebuilt search index."""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = view = memoryview(self._mmap)
+        magic_len = len(SEARCH_INDEX_MAGIC)
+        if view[:magic_len] != SEARCH_INDEX_MAGIC:
+            raise ValueError(f"not a search index file: {path}")
+        header_len = int.from_bytes(view[magic_len:magic_len + 4], "little")
+        data_start = magic_len + 4 + header_len
+        header = json.loads(bytes(view[magic_len + 4:data_start]))
+        if header.get("format") != SEARCH_INDEX_FORMAT:
+            raise ValueError(f"unsupported search index format: {header.get('format')}")
+        self.codes: Dict[str, Dict] = header["codes"]
+        self._terms = header["terms"]
+        self._data = view[data_start:]
+
+    @classmethod
+    def open(cls, path: Path) -> Optional["_SearchIndexFile"]:
+        """Map the index file; None if it is missing or unreadable on this host."""
+        if sys.byteorder != "little" or not path.exists():
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError, KeyError) as e:
+            _log(f"Ignoring search index {path.name}: {e}")
+            return None
+
+    def close(self) -> bool:
+        """Unmap the file; False while columns handed out are still referenced (retry later)."""
+        self._data.release()
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            return False
+        return True
+
+    def is_current(self, code: str, json_file: Path) -> bool:
+        """Whether the stored columns for code were built from json_file as it is now."""
+        entry = self.codes.get(code)
+        try:
+            return (entry is not None and entry["file"] == json_file.name
+                    and entry["size"] == json_file.stat().st_size
+                    and entry["md5"] == _file_md5(json_file))
+        except OSError:
+            return False
+
+    def _column(self, start: int, length: int, count: int, kind: str):
+        block = self._data[start:start + length]
+        if kind == "s":
+            return str(block, "utf-8").split("\n") if count else []
+        if kind in ("t", "j"):
+            split = 4 * (count + 1)
+            text = _TextColumn(block[:split].cast("I"), block[split:])
+            return _RecordView(text) if kind == "j" else text
+        return block.cast(kind)
+
+    def terms(self) -> List[str]:
+        """The global term table the columns' term IDs refer to."""
+        return self._column(*self._terms)
+
+    def columns(self, code: str) -> _IndexColumns:
+        """Index columns for code; all but the string columns are views into the mapped file."""
+        layout = self.codes[code]["columns"]
+        return _IndexColumns(**{name: self._column(*entry) for name, entry in layout.items()})
+
+
+# Open PDF handles kept for reuse across requests: opening a 1,700-page code
+# PDF costs more than extracting a page from it
+PDF_POOL_MAX_OPEN = 8
+PDF_POOL_IDLE_SECONDS = 300
+
+# Worker processes verifying the PDFs of a folder passed to set_pdf_path.
+# Starting a worker costs about a second, so folders holding less PDF data
+# than PDF_SCAN_PARALLEL_BYTES are verified in-process.
+PDF_SCAN_WORKERS = 4
+PDF_SCAN_PARALLEL_BYTES = 256 * 1024 * 1024
+
+# PyMuPDF is not thread-safe, across documents too: every use goes through
+# a _DocumentPool checkout, and checkouts hold this lock
+_FITZ_LOCK = threading.RLock()
+
+
+class _DocumentPool:
+    """Open fitz.Document handles, one per code, used under _FITZ_LOCK.
+
+    A checkout holds _FITZ_LOCK while the document is in use, so a long job
+    should check out per batch of pages. At most max_open codes keep a
+    handle open (opening another retires the least recently used one), and
+    handles idle for idle_seconds are retired on the next checkout.
+    invalidate() retires a code's handle when its PDF is rebound. Retired
+    handles are closed as soon as no checkout is using them: at once when
+    _FITZ_LOCK is free, else when the running checkout ends.
+    """
+
+    def __init__(self, max_open: int = PDF_POOL_MAX_OPEN, idle_seconds: float = PDF_POOL_IDLE_SECONDS):
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self._handles: "OrderedDict[str, list]" = OrderedDict()  # code -> [path, document, last used], oldest first
+        self._retired: List[Any] = []
+        self._users: Dict[int, int] = {}  # id(document) -> checkouts using it (nested on one thread)
+        self._state = threading.Lock()  # guards the above; invalidate() runs without _FITZ_LOCK
+
+    @contextmanager
+    def checkout(self, code: str, path: str) -> Iterator[Any]:
+        """Borrow the open document for path, opening it on first use."""
+        with _FITZ_LOCK:
+            doc = self._acquire(code, path)
+            try:
+                yield doc
+            finally:
+                with self._state:
+                    self._users[id(doc)] -= 1
+                    if not self._users[id(doc)]:
+                        del self._users[id(doc)]
+                self._close_retired()
+
+    def invalidate(self, code: str):
+        """Retire code's handle; it is closed now unless a checkout is running."""
+        with self._state:
+            self._retire(code)
+        if _FITZ_LOCK.acquire(blocking=False):
+            try:
+                self._close_retired()
+            finally:
+                _FITZ_LOCK.release()
+
+    def open_count(self) -> int:
+        with self._state:
+            return len(self._handles) + len(self._retired)
+
+    def _acquire(self, code: str, path: str) -> Any:
+        # Callers hold _FITZ_LOCK
+        with self._state:
+            handle = self._handles.get(code)
+            if handle is not None and handle[0] != path:
+                self._retire(code)
+                handle = None
+            cutoff = time.monotonic() - self.idle_seconds
+            for idle_code in [c for c, (_, _, used) in self._handles.items() if used < cutoff and c != code]:
+                self._retire(idle_code)
+        self._close_retired()
+        doc = handle[1] if handle is not None else fitz.open(path)
+        with self._state:
+            self._handles[code] = [path, doc, time.monotonic()]
+            self._handles.move_to_end(code)
+            while len(self._handles) > self.max_open:
+                self._retire(next(iter(self._handles)))
+            self._users[id(doc)] = self._users.get(id(doc), 0) + 1
+        return doc
+
+    def _retire(self, code: str):
+        # Callers hold self._state
+        handle = self._handles.pop(code, None)
+        if handle is not None:
+            self._retired.append(handle[1])
+
+    def _close_retired(self):
+        # Callers hold _FITZ_LOCK; documents still in use wait for their checkout to end
+        with self._state:
+            closing = [doc for doc in self._retired if id(doc) not in self._users]
+            self._retired = [doc for doc in self._retired if id(doc) in self._users]
+        for doc in closing:
+            try:
+                doc.close()
+            except Exception:
+                pass
+
+
+def _pdf_version_issues(code: str, doc: Any, max_map_page: int) -> List[str]:
+    """Reasons an open PDF may not be the version of code the map was built from."""
+    version_issues = []
+    pdf_pages = len(doc)
+
+    # Check 1: Text markers (preferred method)
+    if code in VERSION_MARKERS:
+        marker_info = VERSION_MARKERS[code]
+        marker_page = marker_info["page"]
+        expected_markers = marker_info["markers"]
+
+        # Extract text from the specified page (usually first page)
+        if marker_page < len(doc):
+            page_text = doc[marker_page].get_text()
+
+            # Check if all markers are present
+            missing_markers = []
+            for marker in expected_markers:
+                if marker not in page_text:
+                    missing_markers.append(marker)
+
+            if missing_markers:
+                version_issues.append(
+                    f"Version markers not found: {missing_markers[:2]}. "
+                    f"This may not be the correct version of {code}."
+                )
+
+        # Check 2: Expected page count (if specified)
+        expected_pages = marker_info.get("expected_pages")
+        if expected_pages:
+            page_diff = abs(pdf_pages - expected_pages)
+            if page_diff > 50:  # Allow 50 page tolerance
+                version_issues.append(
+                    f"Page count mismatch: PDF has {pdf_pages} pages, "
+                    f"expected ~{expected_pages} pages."
+                )
+
+    # Check 3: Fallback - compare with map's max page
+    if pdf_pages < max_map_page:
+        version_issues.append(
+            f"PDF has {pdf_pages} pages, but map references page {max_map_page}."
+        )
+    return version_issues
+
+
+def _version_warning(code: str, version_issues: List[str]) -> Optional[str]:
+    """Combine version issues into set_pdf_path's warning (None when there are none)."""
+    if not version_issues:
+        return None
+    return (
+        f"PDF version mismatch detected for {code}:\n" +
+        "\n".join(f"  • {issue}" for issue in version_issues) +
+        f"\n\nText extraction may return incorrect content. "
+        f"Please ensure you have the correct PDF version."
+    )
+
+
+def _redirect_worker_stdout() -> None:
+    """Point a worker process's stdout at stderr; the inherited fd 1 is the server's JSON-RPC pipe."""
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+
+def _verify_pdf_file(code: str, path: str, max_map_page: int) -> List[str]:
+    """Open the PDF at path and check its version; run in worker processes by folder scans."""
+    doc = fitz.open(path)
+    try:
+        return _pdf_version_issues(code, doc, max_map_page)
+    finally:
+        doc.close()
+
+
+# Extracted page text persisted per PDF (optional; see BuildingCodeMCP's
+# text_cache_dir). One append-only file per PDF MD5: magic and u32 page count,
+# then records of (u32 page, f64 clip left, f64 clip bottom, u32 length) and
+# the zlib-compressed text; a clip of NaN is the full page. Appends are single
+# O_APPEND writes, so processes sharing the directory never interleave records,
+# and a record cut short by a crash is ignored.
+PAGE_TEXT_MAGIC = b"BCMTXT01"
+_PAGE_TEXT_HEADER = struct.Struct("<8sI")
+_PAGE_TEXT_RECORD = struct.Struct("<IddI")
+
+
+class _PageTextStore:
+    """On-disk page text of one PDF, read one page at a time with a single seek."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.page_count: Optional[int] = None
+        self._records: Dict[tuple, tuple] = {}  # (page, clip) -> (offset, length)
+        self._scanned = 0
+        self._lock = threading.Lock()
+        self._scan()
+
+    def get(self, page: int, clip: Optional[tuple]) -> Optional[str]:
+        """Text stored for (page, clip), or None; rescans the file if it grew since the last scan."""
+        with self._lock:
+            record = self._records.get((page, clip))
+            if record is None:
+                # Another process may have appended it since
+                try:
+                    if self.path.stat().st_size > self._scanned:
+                        self._scan()
+                except OSError:
+                    pass
+                record = self._records.get((page, clip))
+        if record is None:
+            return None
+        offset, length = record
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                return zlib.decompress(f.read(length)).decode("utf-8")
+        except (OSError, zlib.error, UnicodeDecodeError):
+            return None
+
+    def put(self, page: int, clip: Optional[tuple], text: str, page_count: int):
+        """Append the text for (page, clip); the file is created on first write."""
+        left, bottom = clip if clip else (math.nan, math.nan)
+        data = zlib.compress(text.encode("utf-8"))
+        record = _PAGE_TEXT_RECORD.pack(page, left, bottom, len(data)) + data
+        with self._lock:
+            try:
+                if self.page_count is None:
+                    self._create(page_count)
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+                try:
+                    written = os.write(fd, record)
+                    end = os.lseek(fd, 0, os.SEEK_CUR)
+                    if written < len(record):
+                        # Cut the partial record off again (disk full, a
+                        # signal), or readers would parse what follows it
+                        # as part of it
+                        os.ftruncate(fd, end - written)
+                        raise OSError(f"short write ({written} of {len(record)} bytes)")
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                _log(f"Page text cache write failed: {e}")
+                return
+            self._records[(page, clip)] = (end - len(data), len(data))
+
+    def _create(self, page_count: int):
+        # Write the header to a private file and link it into place, so no
+        # process ever sees the file without its header
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(_PAGE_TEXT_HEADER.pack(PAGE_TEXT_MAGIC, page_count))
+        try:
+            os.link(tmp, self.path)
+        except FileExistsError:
+            self._scan()  # another process created it first
+        else:
+            self._scanned = _PAGE_TEXT_HEADER.size
+        finally:
+            tmp.unlink()
+        if self.page_count is None:
+            self.page_count = page_count
+
+    def _scan(self):
+        """Index the records written so far (by any process)."""
+        try:
+            size = self.path.stat().st_size
+            with open(self.path, "rb") as f:
+                if self.page_count is None:
+                    header = f.read(_PAGE_TEXT_HEADER.size)
+                    if len(header) < _PAGE_TEXT_HEADER.size:
+                        return
+                    magic, page_count = _PAGE_TEXT_HEADER.unpack(header)
+                    if magic != PAGE_TEXT_MAGIC:
+                        raise OSError(f"not a page text cache file: {self.path}")
+                    self.page_count = page_count
+                    self._scanned = _PAGE_TEXT_HEADER.size
+                offset = self._scanned
+                while offset + _PAGE_TEXT_RECORD.size <= size:
+                    f.seek(offset)
+                    page, left, bottom, length = _PAGE_TEXT_RECORD.unpack(f.read(_PAGE_TEXT_RECORD.size))
+                    start = offset + _PAGE_TEXT_RECORD.size
+                    if start + length > size:
+                        break
+                    clip = None if math.isnan(left) else (left, bottom)
+                    self._records[(page, clip)] = (start, length)
+                    offset = start + length
+                self._scanned = offset
+        except FileNotFoundError:
+            return
+
+
+# Full-text index over a connected PDF (optional; see BuildingCodeMCP's
+# fulltext_index). Saved as one file per PDF MD5 in the text cache dir: magic,
+# u32 header length, a JSON header (code, section signature, term list) padded
+# to 4 bytes, then u32 arrays: words per section, per-term run starts, and the
+# runs of (section, count, positions...) for each term.
+FULLTEXT_MAGIC = b"BCMFTX01"
+FULLTEXT_FORMAT = 1
+FULLTEXT_BATCH_PAGES = 32  # pages extracted per document checkout
+FULLTEXT_PHRASE_BOOST = 2.0  # for sections containing the query as a phrase
+_FULLTEXT_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _fulltext_tokens(text: str) -> List[str]:
+    return _FULLTEXT_TOKEN.findall(text.lower())
+
+
+def _section_signature(index: "_CodeIndex") -> str:
+    """MD5 of the section IDs, pages and bboxes a full-text index credits words by."""
+    c = index.columns
+    digest = hashlib.md5("\n".join(index.ids).encode("utf-8"))
+    digest.update(array("i", c.pages).tobytes())
+    digest.update(array("d", c.bboxes).tobytes())
+    return digest.hexdigest()
+
+
+class _FullTextIndex:
+    """Positional inverted index over the text of one code's connected PDF.
+
+    Every word is credited to the section whose heading precedes it in the
+    PDF (by page, then by the heading's bbox; a section without a bbox starts
+    at the top of its page), so hits resolve to map sections.
+    """
+
+    def __init__(self, code: str, signature: str, terms: List[str],
+                 lengths: Sequence[int], starts: Sequence[int], runs: Sequence[int]):
+        self.code = code
+        self.signature = signature
+        self.terms = terms
+        self._term_ids = {term: tid for tid, term in enumerate(terms)}
+        self.lengths = lengths  # section -> words credited to it
+        self.starts = starts    # term ID -> start of its runs (CSR)
+        self.runs = runs
+        self.documents = sum(1 for length in lengths if length)
+        self.avg_length = sum(lengths) / self.documents if self.documents else 1.0
+
+    @classmethod
+    def build(cls, code: str, index: "_CodeIndex", pages: Iterator[tuple]) -> "_FullTextIndex":
+        """Index (page number, page height, words) in page order, words as from get_text("words")."""
+        c = index.columns
+        headings: Dict[int, List[tuple]] = {}  # page -> (bbox top, origin, section)
+        for idx in range(len(index.ids)):
+            if c.pages[idx] > 0:
+                headings.setdefault(c.pages[idx], []).append((c.bboxes[4 * idx + 1], c.bbox_origins[idx], idx))
+
+        lengths = array("I", [0]) * len(index.ids)
+        positions: Dict[str, Dict[int, List[int]]] = {}
+        current = None  # section still running at the top of the page
+        for page_num, height, words in pages:
+            # Headings as offsets from the page top, in order down the page
+            starts = sorted((0.0 if math.isnan(top) else height - top if origin == "BOTTOMLEFT" else top, idx)
+                            for top, origin, idx in headings.get(page_num, ()))
+            offsets = [offset for offset, _ in starts]
+            for x0, y0, x1, y1, word, *_ in words:
+                i = bisect_right(offsets, (y0 + y1) / 2) - 1
+                idx = starts[i][1] if i >= 0 else current
+                if idx is None:
+                    continue
+                for token in _fulltext_tokens(word):
+                    positions.setdefault(token, {}).setdefault(idx, []).append(lengths[idx])
+                    lengths[idx] += 1
+            if starts:
+                current = starts[-1][1]
+
+        terms = sorted(positions)
+        run_starts = array("I", [0])
+        runs = array("I")
+        for term in terms:
+            for idx, term_positions in sorted(positions[term].items()):
+                runs.append(idx)
+                runs.append(len(term_positions))
+                runs.extend(term_positions)
+            run_starts.append(len(runs))
+        return cls(code, _section_signature(index), terms, lengths, run_starts, runs)
+
+    @classmethod
+    def load(cls, path: Path, code: str, signature: str, sections: int) -> Optional["_FullTextIndex"]:
+        """The index saved at path; None if missing, unreadable, damaged or built for other sections."""
+        if sys.byteorder != "little" or not path.exists():
+            return None
+        try:
+            view = memoryview(path.read_bytes())
+            magic_len = len(FULLTEXT_MAGIC)
+            if view[:magic_len] != FULLTEXT_MAGIC:
+                raise ValueError("not a full-text index file")
+            header_len = int.from_bytes(view[magic_len:magic_len + 4], "little")
+            data_start = magic_len + 4 + header_len
+            header = json.loads(bytes(view[magic_len + 4:data_start]))
+            if header.get("format") != FULLTEXT_FORMAT:
+                raise ValueError(f"unsupported full-text index format: {header.get('format')}")
+            if header["code"] != code or header["signature"] != signature or header["sections"] != sections:
+                return None
+            data = view[data_start:].cast("I")
+            terms = header["terms"]
+            starts_end = sections + len(terms) + 1
+            # The arrays must fill the file exactly, with term runs in order
+            # inside it, or a truncated file would be indexed past its end
+            starts = data[sections:starts_end]
+            if (len(data) < starts_end or starts[0] != 0 or starts[-1] != len(data) - starts_end
+                    or any(a > b for a, b in zip(starts, starts[1:]))):
+                raise ValueError("array lengths do not match the file")
+            return cls(code, signature, terms, data[:sections], starts, data[starts_end:])
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            _log(f"Ignoring full-text index {path.name}: {e}")
+            return None
+
+    def save(self, path: Path):
+        """Write the index to path, replacing any previous file atomically."""
+        header = json.dumps({"format": FULLTEXT_FORMAT, "code": self.code, "signature": self.signature,
+                             "sections": len(self.lengths), "terms": self.terms}).encode("utf-8")
+        header += b" " * (-len(header) % 4)  # keep the u32 arrays aligned
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                f.write(FULLTEXT_MAGIC + len(header).to_bytes(4, "little") + header)
+                for column in (self.lengths, self.starts, self.runs):
+                    f.write(array("I", column).tobytes())
+            os.replace(tmp, path)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    def postings(self, term: str) -> Dict[int, Sequence[int]]:
+        """Section -> word positions of term within it."""
+        tid = self._term_ids.get(term)
+        if tid is None:
+            return {}
+        runs = self.runs
+        hits = {}
+        i, end = self.starts[tid], self.starts[tid + 1]
+        while i < end:
+            count = runs[i + 1]
+            hits[runs[i]] = runs[i + 2:i + 2 + count]
+            i += 2 + count
+        return hits
+
+    def score(self, tokens: List[str]) -> Dict[int, float]:
+        """BM25 of each section containing a token, boosted where the tokens occur as a phrase."""
+        postings = {token: self.postings(token) for token in tokens}
+        scores: Dict[int, float] = {}
+        for hits in postings.values():
+            if not hits:
+                continue
+            idf = math.log(1 + (self.documents - len(hits) + 0.5) / (len(hits) + 0.5))
+            for idx, term_positions in hits.items():
+                tf = len(term_positions)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[idx] / self.avg_length)
+                scores[idx] = scores.get(idx, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        if len(tokens) > 1:
+            for idx in set.intersection(*(set(postings[token]) for token in tokens)):
+                following = [set(postings[token][idx]) for token in tokens[1:]]
+                if any(all(start + offset in later for offset, later in enumerate(following, 1))
+                       for start in postings[tokens[0]][idx]):
+                    scores[idx] *= FULLTEXT_PHRASE_BOOST
+        return scores
+
+
+class _IndexWorker:
+    """Background thread running indexing jobs one at a time, with per-code progress.
+
+    submit() queues job(progress) for a code unless a job for the same key
+    (the PDF path) is already queued or running, or has failed and no retry
+    was asked for; the job reports progress(pages_done, total_pages) and
+    returns fields for its final status.
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._status: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, code: str, key: str, job: Callable, retry: bool = False) -> bool:
+        """Queue job for code; False if an identical job is pending or failed (unless retry)."""
+        with self._lock:
+            status = self._status.get(code)
+            skip = ("queued", "indexing") if retry else ("queued", "indexing", "failed")
+            if status and status["state"] in skip and status["key"] == key:
+                return False
+            self._status[code] = {"state": "queued", "key": key, "pages_done": 0, "total_pages": None}
+            self._queue.put((code, key, job))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="building-code-indexer", daemon=True)
+                self._thread.start()
+            return True
+
+    def status(self, code: str) -> Optional[Dict]:
+        """Latest status of code's job: state (queued, indexing, ready, failed) and progress."""
+        with self._lock:
+            status = self._status.get(code)
+            if status is None:
+                return None
+            return {name: value for name, value in status.items() if name != "key"}
+
+    def _update(self, code: str, key: str, **fields) -> bool:
+        # Jobs superseded by a later submit() for the code no longer report
+        with self._lock:
+            status = self._status.get(code)
+            if status is None or status["key"] != key:
+                return False
+            status.update(fields)
+            return True
+
+    def _run(self):
+        while True:
+            code, key, job = self._queue.get()
+            if not self._update(code, key, state="indexing", started=time.time()):
+                continue
+            try:
+                result = job(lambda done, total: self._update(code, key, pages_done=done, total_pages=total))
+            except Exception as e:
+                _log(f"Indexing {code} failed: {e}")
+                self._update(code, key, state="failed", error=str(e), finished=time.time())
+            else:
+                self._update(code, key, state="ready", finished=time.time(), **(result or {}))
+
+
+# set_pdf_path verification results, remembered per code and PDF file so
+# reconnecting an unchanged PDF is a stat() and a lookup. Saved as JSON in the
+# text cache dir when one is set.
+PDF_VERIFICATION_FILE = "pdf_verification.json"
+PDF_VERIFICATION_FORMAT = 1
+
+
+def _file_identity(path: Path) -> Optional[tuple]:
+    """(size, mtime in ns) of a file, None if it cannot be read; a changed file gets a new identity."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _user_cache_dir() -> Path:
+    """Per-user cache directory for state kept without BUILDING_CODE_MCP_CACHE_DIR."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "building-code-mcp"
+
+
+def _verification_signature(code: str, max_page: int) -> str:
+    """What a verification result depends on besides the PDF: code's markers and map."""
+    checks = json.dumps([VERSION_MARKERS.get(code), max_page], sort_keys=True)
+    return hashlib.md5(checks.encode("utf-8")).hexdigest()
+
+
+class _VerificationStore:
+    """PDF verification results by code and absolute path.
+
+    An entry holds the file's size and mtime, the checks' signature, the
+    resulting warning (None = verified) and, once computed, the file's MD5.
+    It is only returned while the identity and signature still match.
+    """
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self._entries: Optional[Dict[str, Dict[str, Dict]]] = None
+        self._lock = threading.Lock()
+
+    def get(self, code: str, pdf_path: str, identity: tuple, signature: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._load().get(code, {}).get(pdf_path)
+        if entry and (entry["size"], entry["mtime_ns"]) == identity and entry["signature"] == signature:
+            return entry
+        return None
+
+    @staticmethod
+    def _valid_entry(entry: Any) -> bool:
+        return (isinstance(entry, dict)
+                and all(isinstance(entry.get(name), int) for name in ("size", "mtime_ns"))
+                and isinstance(entry.get("signature"), str)
+                and isinstance(entry.get("warning"), (str, type(None)))
+                and isinstance(entry.get("md5", ""), str))
+
+    def put(self, code: str, pdf_path: str, identity: tuple, signature: str, warning: Optional[str]):
+        entry = {"size": identity[0], "mtime_ns": identity[1], "signature": signature, "warning": warning}
+        with self._lock:
+            self._load().setdefault(code, {})[pdf_path] = entry
+            self._save(code, pdf_path)
+
+    def set_md5(self, code: str, pdf_path: str, identity: tuple, md5: str):
+        """Record the MD5 of a PDF whose verification is stored (skipped if the file changed)."""
+        with self._lock:
+            entry = self._load().get(code, {}).get(pdf_path)
+            if entry and (entry["size"], entry["mtime_ns"]) == identity and entry.get("md5") != md5:
+                entry["md5"] = md5
+                self._save(code, pdf_path)
+
+    def _load(self) -> Dict[str, Dict[str, Dict]]:
+        if self._entries is None:
+            self._entries = self._read()
+        return self._entries
+
+    def _read(self) -> Dict[str, Dict[str, Dict]]:
+        if self.path and self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                if data.get("format") == PDF_VERIFICATION_FORMAT:
+                    # Entries not written by this format (a hand-edited
+                    # or damaged file) are dropped rather than trusted
+                    return {
+                        code: {pdf_path: entry for pdf_path, entry in paths.items() if self._valid_entry(entry)}
+                        for code, paths in data["entries"].items() if isinstance(paths, dict)
+                    }
+            except (OSError, ValueError, KeyError, AttributeError) as e:
+                _log(f"Ignoring PDF verification cache: {e}")
+        return {}
+
+    def _save(self, code: str, pdf_path: str):
+        """Write the entry for (code, pdf_path) into the file.
+
+        Other processes save to the same file, so the entries on disk are
+        re-read and this one merged into them rather than the file being
+        rewritten from this process's (possibly stale) copy.
+        """
+        if self.path is None:
+            return
+        entries = self._read()
+        entries.setdefault(code, {})[pdf_path] = self._entries[code][pdf_path]
+        self._entries = entries
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps({"format": PDF_VERIFICATION_FORMAT, "entries": self._entries}),
+                           encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            _log(f"PDF verification cache not saved: {e}")
+
 
 class BuildingCodeMCP:
     """Canadian Building Code MCP Server"""
 
-    def __init__(self, maps_dir: str = "maps"):
+    def __init__(self, maps_dir: str = "maps", text_cache_dir: Optional[str] = None,
+                 fulltext_index: bool = False, verification_file: Optional[str] = None,
+                 fulltext_dir: Optional[str] = None):
         self.maps_dir = Path(maps_dir)
-        self.maps: Dict[str, Dict] = {}
+        # Optional directory persisting extracted PDF page text across restarts
+        self.text_cache_dir = Path(text_cache_dir) if text_cache_dir else None
+        self._text_stores: Dict[str, Optional[_PageTextStore]] = {}
+        # PDF verification results are saved in the text cache dir, else in
+        # verification_file when given (else kept in memory only)
+        if self.text_cache_dir:
+            verification_file = self.text_cache_dir / PDF_VERIFICATION_FILE
+        self._verifications = _VerificationStore(Path(verification_file) if verification_file else None)
+        # Index each PDF's full text in the background once it is connected.
+        # Built indexes are saved in the text cache dir, else in fulltext_dir.
+        self.fulltext_index = fulltext_index
+        self.fulltext_dir = self.text_cache_dir or (Path(fulltext_dir) if fulltext_dir else None)
+        self._fulltext: Dict[tuple, _FullTextIndex] = {}  # (code, PDF path, size and mtime) -> index
+        self._index_worker = _IndexWorker()
+        # Maps are parsed on first use of a code; _map_info holds the manifest
+        # metadata (version, section count, table IDs) for every code
+        self.maps = _MapRegistry(self._load_map)
+        self._map_info: Dict[str, Dict] = {}
+        self._indexes: Dict[str, _CodeIndex] = {}
+        self._search_index: Optional[_SearchIndexFile] = None
+        # Index files replaced by reload_maps, unmapped once no index uses them
+        self._retired_search_indexes: List[_SearchIndexFile] = []
+        # Global term table, seeded from the index file on first use; also
+        # the vocabulary for fuzzy matching
+        self._terms: Optional[_TermTable] = None
+        # "Did you mean?" keyword indexes, keyed by code (None = all codes)
+        self._suggesters: Dict[Optional[str], _NgramIndex] = {}
+        # Ranked search results by (query, code, limit, verbose, ranking)
+        self._search_cache = _LRUCache(SEARCH_CACHE_SIZE)
+        # Guards lazy index and term table builds; tools run on worker threads
+        self._lock = threading.RLock()
+        # Normalized table ID -> [(code, table position)], across all codes.
+        # _table_variants keys suffixed tables ("9.23.4.3-i") by their base ID.
+        self._table_index: Dict[str, List[tuple]] = {}
+        self._table_variants: Dict[str, List[tuple]] = {}
         self.pdf_paths: Dict[str, str] = {}
         self.pdf_verified: Dict[str, bool] = {}
+        # Open PDF handles per connected code
+        self._documents = _DocumentPool()
+        # Extracted page text by (PDF MD5, page, clip); page counts and the
+        # connected PDFs' MD5s, so repeated reads never reach PyMuPDF
+        self._page_texts = _LRUCache(PAGE_TEXT_CACHE_BYTES, weigh=sys.getsizeof)
+        self._pdf_page_counts: Dict[str, int] = {}
+        self._pdf_hashes: Dict[str, str] = {}
         self._load_maps()
 
+    @classmethod
+    def from_environment(cls, maps_dir: str = "maps") -> "BuildingCodeMCP":
+        """The server's instance: caches under BUILDING_CODE_MCP_CACHE_DIR, else the per-user cache dir."""
+        cache_dir = _user_cache_dir()
+        return cls(maps_dir, os.environ.get("BUILDING_CODE_MCP_CACHE_DIR"),
+                   os.environ.get("BUILDING_CODE_MCP_FULLTEXT", "") not in ("", "0"),
+                   str(cache_dir / PDF_VERIFICATION_FILE), str(cache_dir / "fulltext"))
+
     def _load_maps(self):
-        """Load all map JSON files."""
+        """Register all map JSON files, parsing only those the manifest doesn't cover."""
+        # Cached search results and full-text indexes would outlive the maps
+        # they were ranked from
+        self._search_cache.clear()
+        self._fulltext.clear()
         if not self.maps_dir.exists():
             return
-        for json_file in self.maps_dir.glob("*.json"):
+
+        manifest = {}
+        manifest_data = _read_map_file(self.maps_dir / MAP_MANIFEST)
+        if isinstance(manifest_data, dict) and manifest_data.get("format") == MAP_MANIFEST_FORMAT:
+            manifest = manifest_data.get("maps", {})
+
+        for json_file in _map_files(self.maps_dir):
+            info = manifest.get(json_file.name)
             try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    code = data.get('code', json_file.stem)
-                    self.maps[code] = data
-            except Exception:
-                pass
+                # Same size first, so only files that may be unchanged are hashed
+                fresh = (info is not None and info.get("size") == json_file.stat().st_size
+                         and info.get("md5") == _file_md5(json_file))
+            except OSError:
+                continue
+            if fresh:
+                data = None
+            else:
+                # Not in the manifest (or changed since): parse it now
+                data = _read_map_file(json_file)
+                if data is None:
+                    continue
+                info = _map_summary(data, json_file)
+            code = info.get("code", json_file.stem)
+            self.maps.register(code, json_file, data)
+            self._map_info[code] = info
+
+        self._build_table_index()
+        self._search_index = _SearchIndexFile.open(self.maps_dir / SEARCH_INDEX)
+
+    def reload_maps(self):
+        """Drop all loaded maps and indexes and register the maps directory again."""
+        with self._lock:
+            if self._search_index:
+                self._retired_search_indexes.append(self._search_index)
+                self._search_index = None
+            self.maps = _MapRegistry(self._load_map)
+            self._map_info = {}
+            self._indexes = {}
+            self._terms = None
+            self._suggesters = {}
+            self._load_maps()
+            self._close_retired_search_indexes()
+
+    def _close_retired_search_indexes(self):
+        """Unmap replaced index files that in-flight searches no longer read from."""
+        # Callers hold self._lock
+        self._retired_search_indexes = [index_file for index_file in self._retired_search_indexes
+                                        if not index_file.close()]
+
+    def search_cache_info(self) -> Dict[str, int]:
+        """Search result cache counters: hits, misses, size and maxsize."""
+        return self._search_cache.info()
+
+    def page_text_cache_info(self) -> Dict[str, int]:
+        """Page text cache counters; weight is the cached text size in bytes."""
+        return self._page_texts.info()
+
+    def _load_map(self, code: str, json_file: Path) -> Dict:
+        """Parse a registered map on first use, refreshing its metadata if stale."""
+        data = _read_map_file(json_file)
+        if data is None:
+            _log(f"Failed to load map: {json_file}")
+            return {}
+        _log(f"Loaded map: {code} ({json_file.name})")
+        info = _map_summary(data, json_file)
+        if info != self._map_info.get(code):
+            _log(f"Map manifest out of date for {code}; run scripts/build_map_manifest.py")
+            info.setdefault("code", code)
+            self._map_info[code] = info
+            self._build_table_index()
+        return data
+
+    def _get_index(self, code: str) -> _CodeIndex:
+        """Search index for a code, from the prebuilt index file or else its map."""
+        index = self._indexes.get(code)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self._indexes.get(code)
+            if index is None:
+                if self._retired_search_indexes:
+                    self._close_retired_search_indexes()
+                table = self._term_table()
+                json_file = self.maps.path(code)
+                if self._search_index and self._search_index.is_current(code, json_file):
+                    columns = self._search_index.columns(code)
+                else:
+                    if self._search_index:
+                        _log(f"Search index out of date for {code}; run scripts/build_search_index.py")
+                    columns = _index_columns(self.maps.read(code), table)
+                doc_type = self._map_info[code].get("document_type", "code")
+                index = self._indexes[code] = _CodeIndex(columns, doc_type, table)
+        return index
+
+    def _term_table(self) -> _TermTable:
+        """The global term table; its IDs match the index file's when there is one."""
+        if self._terms is None:
+            with self._lock:
+                if self._terms is None:
+                    self._terms = _TermTable(self._search_index.terms() if self._search_index else ())
+        return self._terms
+
+    def _build_table_index(self):
+        """Index every code's table IDs from the map metadata."""
+        # Built aside and swapped in whole: searches on other threads read the
+        # current dicts while a lazily loaded map triggers a rebuild
+        table_index: Dict[str, List[tuple]] = {}
+        table_variants: Dict[str, List[tuple]] = {}
+        for code, info in list(self._map_info.items()):
+            for idx, table_id in enumerate(info.get("tables", [])):
+                key = _table_key(table_id)
+                table_index.setdefault(key, []).append((code, idx))
+                base = re.sub(r"-[a-z]$", "", key)
+                if base != key:
+                    table_variants.setdefault(base, []).append((code, idx))
+        self._table_index = table_index
+        self._table_variants = table_variants
 
     def _add_mode_info(self, result: Dict, code: str) -> Dict:
         """Add mode status information to response."""
@@ -321,15 +2090,15 @@ class BuildingCodeMCP:
         codes_compact = []
         guides_compact = []
 
-        for code, data in self.maps.items():
-            doc_type = data.get("document_type", "code")
+        for code, info in self._map_info.items():
+            doc_type = info.get("document_type", "code")
             pdf_connected = code in self.pdf_paths
             can_extract = pdf_connected and PYMUPDF_AVAILABLE
 
             # Compact info (always needed)
             compact_info = {
                 "code": code,
-                "sections": len(data.get("sections", [])),
+                "sections": info["sections"],
                 "status": "BYOD" if pdf_connected else "Map"
             }
 
@@ -342,8 +2111,8 @@ class BuildingCodeMCP:
             if verbose:
                 code_info = {
                     "code": code,
-                    "version": data.get("version", "unknown"),
-                    "sections": len(data.get("sections", [])),
+                    "version": info.get("version", "unknown"),
+                    "sections": info["sections"],
                     "document_type": doc_type,
                     "searchable": True,
                     "status": f"{'✓' if pdf_connected else '○'} {'BYOD Active' if pdf_connected else 'Map Only'}",
@@ -419,45 +2188,151 @@ class BuildingCodeMCP:
                 expanded.update(SYNONYMS[term])
         return expanded
 
-    def _fuzzy_match_score(self, query_term: str, target_terms: set, threshold: int = 80) -> float:
-        """Calculate fuzzy match score for a query term against target terms."""
-        if not FUZZY_AVAILABLE or not target_terms:
-            return 0.0
+    def _fuzzy_vocabulary_matches(self, query_terms: set, threshold: int = 80) -> Dict[str, Dict[int, float]]:
+        """Fuzzy-match each query term once against the global term table.
 
-        # Find best fuzzy match
-        best_score = 0
-        for target in target_terms:
-            ratio = fuzz.ratio(query_term, target)
-            if ratio > best_score:
-                best_score = ratio
+        Returns {query_term: {term_id: normalized_score}} for every table
+        term scoring at or above threshold.
+        """
+        vocabulary = self._term_table().terms
+        if not FUZZY_AVAILABLE or not vocabulary:
+            return {}
 
-        # Return normalized score if above threshold
-        if best_score >= threshold:
-            return best_score / 100.0
-        return 0.0
+        matches = {}
+        for term in query_terms:
+            found = process.extract(term, vocabulary, scorer=fuzz.ratio,
+                                    score_cutoff=threshold, limit=None)
+            if found:
+                matches[term] = {tid: score / 100.0 for _, score, tid in found}
+        return matches
 
     def _suggest_similar_keywords(self, query: str, code: Optional[str] = None, limit: int = 3) -> List[str]:
         """Find similar keywords when search returns no results (for 'Did you mean?' suggestions)."""
         if not FUZZY_AVAILABLE:
             return []
 
-        # Collect all keywords from relevant codes
-        all_keywords = set()
-        maps_to_search = {code: self.maps[code]} if code and code in self.maps else self.maps
-
-        for code_name, data in maps_to_search.items():
-            for section in data.get("sections", []):
-                all_keywords.update(kw.lower() for kw in section.get('keywords', []))
+        scope = code if code and code in self.maps else None
+        suggester = self._suggesters.get(scope)
+        if suggester is None:
+            # Keyword vocabulary for this scope, indexed on first miss and cached
+            if scope:
+                keywords = self._get_index(scope).keywords
+            else:
+                keywords = sorted(set().union(*(self._get_index(c).keywords for c in self.maps)))
+            suggester = self._suggesters[scope] = _NgramIndex(keywords)
 
-        if not all_keywords:
+        if not suggester.terms:
             return []
 
-        # Find best matches using rapidfuzz
-        matches = process.extract(query.lower(), list(all_keywords), limit=limit, score_cutoff=60)
+        # The best-scoring trigram candidates give a floor for the true top
+        # `limit` scores; the full vocabulary scan then skips every term below
+        # it, returning exactly what an unfiltered scan would
+        query_lower = query.lower()
+        matches = process.extract(query_lower, suggester.candidates(query_lower), limit=limit, score_cutoff=60)
+        score_cutoff = matches[-1][1] if len(matches) == limit else 60
+        matches = process.extract(query_lower, suggester.terms, limit=limit, score_cutoff=score_cutoff)
         return [match[0] for match in matches]
 
+    def _rank_sections(self, query_lower: str, code: Optional[str], limit: int,
+                       verbose: bool, bm25: bool) -> tuple:
+        """Score every matching section; returns (top `limit` result dicts, total matches)."""
+        query_terms = set(query_lower.split())
+        # Expand with synonyms
+        expanded_terms = self._expand_query_with_synonyms(query_terms)
+
+        codes_to_search = [code] if code and code in self.maps else list(self.maps.keys())
+        indexes = [self._get_index(code_name) for code_name in codes_to_search]
+
+        # Typo tolerance: fuzzy-match the query terms against the vocabulary
+        # once, then resolve the matched terms through the inverted index
+        fuzzy_matches = self._fuzzy_vocabulary_matches(query_terms)
+
+        # Query terms as global term IDs (terms no code has are dropped)
+        term_ids = self._term_table().ids
+        expanded_ids = {term_ids[term] for term in expanded_terms if term in term_ids}
+        query_ids = {term_ids[term] for term in query_terms if term in term_ids}
+
+        # (score, code order, section position) - sorting on this keeps the
+        # document order among equal scores, same as a full in-order scan
+        if NUMPY_AVAILABLE and not bm25:
+            scored, total = _vector_candidates(indexes, query_lower, len(query_terms), len(expanded_terms),
+                                               query_ids, expanded_ids, fuzzy_matches, limit)
+        else:
+            scored, total = _python_candidates(indexes, query_lower, query_terms, len(expanded_terms),
+                                               query_ids, expanded_ids, fuzzy_matches, bm25)
+
+        return self._top_results(scored, indexes, codes_to_search, code, limit, verbose), total
+
+    def _rank_fulltext(self, query_lower: str, code: Optional[str], fulltext: List[tuple],
+                       limit: int, verbose: bool) -> tuple:
+        """Score sections by the PDF text credited to them; returns (top `limit` result dicts, total matches)."""
+        tokens = _fulltext_tokens(query_lower)
+        scored = []
+        for code_rank, (_, index) in enumerate(fulltext):
+            for idx, score in index.score(tokens).items():
+                scored.append((score, code_rank, idx, "fulltext"))
+        codes = [code_name for code_name, _ in fulltext]
+        indexes = [self._get_index(code_name) for code_name in codes]
+        return self._top_results(scored, indexes, codes, code, limit, verbose), len(scored)
+
+    def _top_results(self, scored: List[tuple], indexes: List[_CodeIndex], codes_to_search: List[str],
+                     code: Optional[str], limit: int, verbose: bool) -> List[Dict]:
+        """Result dicts for the best `limit` of (score, code order, section position, match type)."""
+        # Keep only the best `limit` candidates in a bounded heap. Section ID
+        # matches rank first (default-mode text scores stay below 1.5, but
+        # BM25 scores are unbounded); equal rounded scores keep document order.
+        def rank_key(candidate):
+            score, code_rank, idx, match_type = candidate
+            # Boost tables slightly to ensure they appear in results
+            if indexes[code_rank].is_table[idx]:
+                score += 0.01
+            return (match_type != "exact_id", -round(score, 3), code_rank, idx)
+
+        top = heapq.nsmallest(limit, scored, key=rank_key)
+
+        # Result dicts are built for the selected candidates only
+        limited_results = []
+        for candidate in top:
+            _, neg_score, code_rank, idx = rank_key(candidate)
+            match_type = candidate[3]
+            index = indexes[code_rank]
+            columns = index.columns
+            doc_type = index.doc_type
+
+            # Compact result (default) - minimal tokens
+            page = columns.pages[idx]
+            result_item = {
+                "id": index.ids[idx],
+                "title": columns.titles[idx],
+                "page": None if page == -1 else page,
+                "score": -neg_score
+            }
+
+            # Add code only if searching multiple codes
+            if not code:
+                result_item["code"] = codes_to_search[code_rank]
+
+            # Verbose mode - include extra metadata
+            if verbose:
+                result_item["document_type"] = doc_type
+                if columns.types[idx]:
+                    result_item["type"] = columns.types[idx]
+                if columns.levels[idx]:
+                    result_item["level"] = columns.levels[idx]
+                if columns.page_ends[idx] > 0:
+                    result_item["page_end"] = columns.page_ends[idx]
+                if match_type:
+                    result_item["match_type"] = match_type
+                if doc_type == "guide":
+                    result_item["note"] = "Guide - NOT legally binding"
+
+            limited_results.append(result_item)
+
+        return limited_results
+
     def search_code(self, query: str, code: Optional[str] = None,
-                    limit: int = 10, verbose: bool = False) -> Dict:
+                    limit: int = 10, verbose: bool = False,
+                    ranking: str = "default", scope: str = "map") -> Dict:
         """Search for sections matching query with fuzzy matching and synonym support.
 
         Args:
@@ -465,6 +2340,10 @@ class BuildingCodeMCP:
             code: Optional specific code to search
             limit: Max results to return (default 10, max 50)
             verbose: If True, include keywords, match_type, etc. (default False for token efficiency)
+            ranking: "default" (share of query terms matched) or "bm25" (BM25F over
+                title and keywords, weighting rare terms and title hits higher)
+            scope: "map" (titles and keywords) or "fulltext" (the text of connected
+                PDFs, ranked by BM25; falls back to the map until an index is built)
         """
         # Clamp limit
         limit = max(1, min(limit, 50))
@@ -476,6 +2355,14 @@ class BuildingCodeMCP:
         if not query or not isinstance(query, str):
             return {"error": "Query is required", "query": "", "results": [], "total": 0}
 
+        if ranking not in RANKING_MODES:
+            return {"error": f"Unknown ranking: {ranking}. Use one of: {', '.join(RANKING_MODES)}",
+                    "query": query, "results": [], "total": 0}
+        bm25 = ranking == "bm25"
+        if scope not in SEARCH_SCOPES:
+            return {"error": f"Unknown scope: {scope}. Use one of: {', '.join(SEARCH_SCOPES)}",
+                    "query": query, "results": [], "total": 0}
+
         # Check if code is web-reference only (like OFC)
         if code and code in WEB_REFERENCE_CODES:
             web_info = WEB_REFERENCE_CODES[code]
@@ -491,107 +2378,46 @@ class BuildingCodeMCP:
         if code and code not in self.maps:
             return {"error": f"Code not found: {code}", "query": query, "results": [], "total": 0}
 
-        results = []
         query_lower = query.lower().strip()
         if not query_lower:
             return {"error": "Query cannot be empty", "query": query, "results": [], "total": 0}
 
-        query_terms = set(query_lower.split())
-        # Expand with synonyms
-        expanded_terms = self._expand_query_with_synonyms(query_terms)
-
-        maps_to_search = {code: self.maps[code]} if code and code in self.maps else self.maps
-
-        for code_name, data in maps_to_search.items():
-            doc_type = data.get("document_type", "code")
-            for section in data.get("sections", []):
-                section_id = section.get("id", "")
-                title = section.get("title", "")
-                keywords = set(kw.lower() for kw in section.get('keywords', []))
-                title_words = set(title.lower().split())
-                all_terms = keywords | title_words
-
-                # Score calculation
-                score = 0.0
-                match_type = None
-
-                # 1. Section ID exact/partial match (highest priority)
-                if query_lower in section_id.lower():
-                    score = 2.0 if section_id.lower().endswith(query_lower) else 1.5
-                    match_type = "exact_id"
-
-                # 2. Exact keyword/title word matches (including synonyms)
-                elif expanded_terms:
-                    matches = expanded_terms & all_terms
-                    if matches:
-                        # Boost if original terms matched (not just synonyms)
-                        original_matches = query_terms & all_terms
-                        if original_matches:
-                            score = len(original_matches) / len(query_terms)
-                            match_type = "exact"
-                        else:
-                            # Synonym match - slightly lower score
-                            score = (len(matches) / len(expanded_terms)) * 0.9
-                            match_type = "synonym"
-
-                # 3. Fuzzy matching (typo tolerance) - only if no exact match
-                if score == 0 and FUZZY_AVAILABLE:
-                    fuzzy_scores = []
-                    for term in query_terms:
-                        fscore = self._fuzzy_match_score(term, all_terms)
-                        if fscore > 0:
-                            fuzzy_scores.append(fscore)
-
-                    if fuzzy_scores:
-                        score = (sum(fuzzy_scores) / len(query_terms)) * 0.8  # Fuzzy gets lower weight
-                        match_type = "fuzzy"
-
-                if score > 0:
-                    # Boost tables slightly to ensure they appear in results
-                    if section.get("type") == "table":
-                        score += 0.01
-
-                    # Compact result (default) - minimal tokens
-                    result_item = {
-                        "id": section_id,
-                        "title": title,
-                        "page": section.get("page"),
-                        "score": round(score, 3)
-                    }
-
-                    # Add code only if searching multiple codes
-                    if not code:
-                        result_item["code"] = code_name
-
-                    # Verbose mode - include extra metadata
-                    if verbose:
-                        result_item["document_type"] = doc_type
-                        if section.get("type"):
-                            result_item["type"] = section.get("type")
-                        if section.get("level"):
-                            result_item["level"] = section.get("level")
-                        if section.get("page_end"):
-                            result_item["page_end"] = section.get("page_end")
-                        if match_type:
-                            result_item["match_type"] = match_type
-                        if doc_type == "guide":
-                            result_item["note"] = "Guide - NOT legally binding"
-
-                    results.append(result_item)
-
-        results.sort(key=lambda x: x["score"], reverse=True)
-
-        # Apply limit
-        limited_results = results[:limit]
+        # Repeats of a search (same terms, code, limit, verbose and ranking)
+        # come from the cache; only the response envelope is rebuilt per call.
+        # Map ranking only depends on the set of query terms (section IDs
+        # hold no whitespace, so only a one-term query can match one), so it
+        # runs on the deduplicated words and word order shares an entry.
+        query_lower = " ".join(query_lower.split())
+        fulltext, pending = self._fulltext_codes(code) if scope == "fulltext" else ([], [])
+        if fulltext:
+            # Not cached: results follow whichever PDFs are connected
+            ranked = self._rank_fulltext(query_lower, code, fulltext, limit, verbose)
+        else:
+            terms = query_lower.split()
+            key = (frozenset(terms), code, limit, verbose, ranking)
+            ranked = self._search_cache.get(key)
+            if ranked is None:
+                ranked = self._rank_sections(" ".join(dict.fromkeys(terms)), code, limit, verbose, bm25)
+                self._search_cache.put(key, ranked)
+        top, total = ranked
+        limited_results = [dict(item) for item in top]
 
         # Compact response (default)
         response = {
             "results": limited_results,
-            "total": len(results)
+            "total": total
         }
 
+        if scope == "fulltext":
+            if pending:
+                response["note"] = f"Full-text index still building for: {', '.join(pending)}"
+                if not fulltext:
+                    response["note"] += ". Showing map results."
+            elif not fulltext:
+                response["note"] = "Full-text search needs a connected PDF (set_pdf_path). Showing map results."
+
         # Add "Did you mean?" suggestion when no results
-        if len(results) == 0:
+        if total == 0:
             similar = self._suggest_similar_keywords(query, code)
             if similar:
                 response["suggestion"] = f"No results for '{query}'. Did you mean: {', '.join(similar)}?"
@@ -602,13 +2428,17 @@ class BuildingCodeMCP:
         if verbose:
             response["query"] = query
             response["search_features"] = ["synonyms", "fuzzy"] if FUZZY_AVAILABLE else ["synonyms"]
+            if bm25:
+                response["ranking"] = ranking
+            if fulltext:
+                response["scope"] = scope
             if code:
                 response = self._add_mode_info(response, code)
-        elif len(results) > limit:
-            response["hint"] = f"Showing {limit}/{len(results)}. Use limit param for more."
+        elif total > limit:
+            response["hint"] = f"Showing {limit}/{total}. Use limit param for more."
 
         # Log search results
-        _log(f"search: found {len(results)} results, returning {len(limited_results)}")
+        _log(f"search: found {total} results, returning {len(limited_results)}")
 
         return response
 
@@ -625,132 +2455,192 @@ class BuildingCodeMCP:
         if code not in self.maps:
             return {"error": f"Code not found: {code}"}
 
-        data = self.maps[code]
-        version = data.get("version", "unknown")
-        doc_type = data.get("document_type", "code")
-
-        # Try exact match first, then try with Division prefixes
-        search_ids = [section_id]
-        if not section_id.startswith(('A-', 'B-', 'C-', 'Commentary-', 'Part')):
-            search_ids.extend([f'A-{section_id}', f'B-{section_id}', f'C-{section_id}'])
-
-        for section in data.get("sections", []):
-            if section.get("id") in search_ids:
-                actual_id = section.get("id")
-                page = section.get("page")
-
-                # Compact result (default) - essential fields only
-                result = {
-                    "id": actual_id,
-                    "title": section.get("title", ""),
-                    "page": page,
-                    "citation": f"{code} {version}, s. {actual_id}"
-                }
+        # Exact match first, then with Division prefixes (one index probe)
+        index = self._get_index(code)
+        idx = index.find(section_id)
+        if idx is None:
+            return {"error": f"Section not found: {section_id}"}
+        section = index.section(idx)
 
-                # Add text if PDF connected (always include - it's the main value)
-                if code in self.pdf_paths and self.pdf_verified.get(code):
-                    text = self._extract_text(code, section)
-                    if text:
-                        result["text"] = text
+        # Add text if PDF connected (always include - it's the main value)
+        text = None
+        if code in self.pdf_paths and self.pdf_verified.get(code):
+            text = self._extract_text(code, section)
+        return self._section_result(code, section_id, section, text, verbose)
 
-                # Verbose mode - include all metadata
-                if verbose:
-                    result["code"] = code
-                    result["version"] = version
-                    result["document_type"] = doc_type
-                    result["citation_full"] = f"{code} {version}, Section {actual_id}" + (f", Page {page}" if page else "")
+    def get_sections(self, code: str, section_ids: List[str], verbose: bool = False) -> Dict:
+        """Get several sections of one code in a single call.
 
-                    if actual_id != section_id:
-                        result["note"] = f"Found as '{actual_id}'"
+        With a PDF connected, the pages of all sections are read together:
+        the document is opened once and each page extracted once, however
+        many of the sections share it. Maximum 20 sections per request.
 
-                    if section.get("keywords"):
-                        result["keywords"] = section.get("keywords")
-                    if section.get("bbox"):
-                        result["bbox"] = section.get("bbox")
+        Args:
+            code: Code name
+            section_ids: Section IDs to retrieve, in the order results are wanted
+            verbose: If True, include all metadata for each section
+        """
+        _log(f"get_sections: {len(section_ids or [])} ids code={code}")
 
-                    if doc_type == "guide":
-                        result["warning"] = "Interpretation guide - NOT legally binding"
+        if code not in self.maps:
+            return {"error": f"Code not found: {code}"}
+        if not section_ids or not isinstance(section_ids, list):
+            return {"error": "Section IDs are required"}
+        if len(section_ids) > 20:
+            return {"error": f"Maximum 20 sections per request. Requested {len(section_ids)}."}
+
+        index = self._get_index(code)
+        found = []
+        not_found = []
+        for section_id in section_ids:
+            idx = index.find(section_id) if isinstance(section_id, str) else None
+            if idx is None:
+                not_found.append(section_id)
+            else:
+                found.append((section_id, index.section(idx)))
 
-                    # PDF status info
-                    if code not in self.pdf_paths:
-                        result["text_status"] = "PDF not connected"
-                    elif not self.pdf_verified.get(code):
-                        result["text_status"] = "PDF version mismatch"
+        # Every page any section needs, each (page, clip) read once
+        texts: Dict[tuple, Optional[str]] = {}
+        total_pages = 0
+        if PYMUPDF_AVAILABLE and code in self.pdf_paths and self.pdf_verified.get(code):
+            try:
+                total_pages = self._pdf_page_count(code)
+                requests = list(dict.fromkeys(request for _, section in found
+                                              for request in self._section_pages(section, total_pages)))
+                if requests:
+                    _, page_texts = self._read_pdf_texts(code, requests)
+                    texts = dict(zip(requests, page_texts))
+            except Exception as e:
+                _log(f"get_sections: text extraction failed: {e}")
+
+        sections = []
+        for section_id, section in found:
+            requests = self._section_pages(section, total_pages)
+            text = None
+            if texts and requests:
+                text = self._join_section_text([texts[request] for request in requests])
+            sections.append(self._section_result(code, section_id, section, text, verbose))
+
+        result = {"code": code, "sections": sections}
+        if not_found:
+            result["not_found"] = not_found
+        return result
 
-                    result = self._add_mode_info(result, code)
-                    result["disclaimer_ref"] = "buildingcode://disclaimer"
+    def _section_result(self, code: str, section_id: str, section: _Section,
+                        text: Optional[str], verbose: bool) -> Dict:
+        """get_section's result for a resolved section and its extracted text."""
+        info = self._map_info[code]
+        version = info.get("version", "unknown")
+        doc_type = info.get("document_type", "code")
+
+        actual_id = section.id
+        page = section.page
+
+        # Compact result (default) - essential fields only
+        result = {
+            "id": actual_id,
+            "title": section.title,
+            "page": page,
+            "citation": f"{code} {version}, s. {actual_id}"
+        }
 
-                return result
+        if text:
+            result["text"] = text
 
-        return {"error": f"Section not found: {section_id}"}
+        # Verbose mode - include all metadata
+        if verbose:
+            result["code"] = code
+            result["version"] = version
+            result["document_type"] = doc_type
+            result["citation_full"] = f"{code} {version}, Section {actual_id}" + (f", Page {page}" if page else "")
+
+            if actual_id != section_id:
+                result["note"] = f"Found as '{actual_id}'"
+
+            if section.keywords:
+                result["keywords"] = section.keywords
+            if section.bbox:
+                result["bbox"] = section.bbox
+
+            if doc_type == "guide":
+                result["warning"] = "Interpretation guide - NOT legally binding"
 
-    def get_hierarchy(self, section_id: str, code: str) -> Dict:
-        """Get parent, children, siblings of a section."""
+            # PDF status info
+            if code not in self.pdf_paths:
+                result["text_status"] = "PDF not connected"
+            elif not self.pdf_verified.get(code):
+                result["text_status"] = "PDF version mismatch"
+
+            result = self._add_mode_info(result, code)
+            result["disclaimer_ref"] = "buildingcode://disclaimer"
+
+        return result
+
+    def get_hierarchy(self, section_id: str, code: str, depth: int = 1) -> Dict:
+        """Get parent, children, siblings of a section.
+
+        Args:
+            section_id: Section ID to get hierarchy for
+            code: Code name
+            depth: Levels of descendants to include (default 1 = direct children,
+                max 5). Deeper levels are nested under each child's "children".
+        """
         # Input validation
         if not section_id or not isinstance(section_id, str):
             return {"error": "Section ID is required"}
         if not code or code not in self.maps:
             return {"error": f"Code not found: {code}"}
+        depth = max(1, min(depth, 5))
 
-        sections = self.maps[code].get("sections", [])
-
-        # Find current section first (to get parent_id field)
-        current = None
-        for s in sections:
-            if s.get("id") == section_id:
-                current = s
-                break
-
-        # Bug fix: Use parent_id field from section data, not string parsing
-        parent = None
-        parent_id = current.get("parent_id") if current else None
+        index = self._get_index(code)
+        titles = index.columns.titles
 
-        # Fallback to string parsing if parent_id field not available
-        if not parent_id:
-            parts = section_id.split(".")
-            parent_id = ".".join(parts[:-1]) if len(parts) > 1 else None
+        # Parent comes from the precomputed tree (parent_id field, falling
+        # back to string parsing); unindexed IDs only get the string parse
+        current_idx = index.by_id.get(section_id)
+        if current_idx is not None:
+            parent_id = index.parent_ids[current_idx]
+        else:
+            parent_id = _parent_from_id(section_id)
 
         # Find parent section
+        parent = None
         if parent_id:
-            for s in sections:
-                if s.get("id") == parent_id:
-                    parent = {"id": s["id"], "title": s.get("title")}
-                    break
+            parent_idx = index.by_id.get(parent_id)
+            if parent_idx is not None:
+                parent = {"id": index.ids[parent_idx], "title": titles[parent_idx]}
             # If parent not in sections, return parent_id info anyway
-            if not parent:
+            else:
                 parent = {"id": parent_id, "title": "(not in map)", "note": "Parent section not indexed"}
 
-        # Find children
-        children = []
-        for s in sections:
-            sid = s.get("id", "")
-            # Check if this section's parent_id matches current section
-            if s.get("parent_id") == section_id:
-                children.append({"id": sid, "title": s.get("title")})
-            # Fallback: string matching for older maps
-            elif sid.startswith(section_id + ".") and sid.count(".") == section_id.count(".") + 1:
-                if not any(c["id"] == sid for c in children):
-                    children.append({"id": sid, "title": s.get("title")})
-
-        # Find siblings (same parent)
+        children = self._hierarchy_children(index, section_id, depth)
+
+        # Siblings share the parent's child list
         siblings = []
         if parent_id:
-            for s in sections:
-                sid = s.get("id", "")
-                s_parent = s.get("parent_id")
-                # Check by parent_id field
-                if s_parent == parent_id and sid != section_id:
-                    siblings.append({"id": sid, "title": s.get("title")})
-                # Fallback: string matching
-                elif not s_parent and sid.startswith(parent_id + ".") and sid.count(".") == section_id.count(".") and sid != section_id:
-                    if not any(sib["id"] == sid for sib in siblings):
-                        siblings.append({"id": sid, "title": s.get("title")})
+            for idx in index.children.get(parent_id, ()):
+                if index.ids[idx] != section_id:
+                    siblings.append({"id": index.ids[idx], "title": titles[idx]})
 
         result = {"section_id": section_id, "parent": parent, "children": children, "siblings": siblings}
+        if depth > 1:
+            result["depth"] = depth
         # Add mode info
         result = self._add_mode_info(result, code)
         return result
 
+    def _hierarchy_children(self, index: _CodeIndex, section_id: str, depth: int) -> List[Dict]:
+        """Children of section_id from the tree, nesting descendants up to depth levels."""
+        children = []
+        for idx in index.children.get(section_id, ()):
+            child = {"id": index.ids[idx], "title": index.columns.titles[idx]}
+            if depth > 1:
+                grandchildren = self._hierarchy_children(index, child["id"], depth - 1)
+                if grandchildren:
+                    child["children"] = grandchildren
+            children.append(child)
+        return children
+
     def set_pdf_path(self, code: str, path: str) -> Dict:
         """Connect user's PDF for text extraction. If path is a folder, auto-scan for PDFs."""
         _log(f"set_pdf_path: code={code} path='{path}'")
@@ -774,75 +2664,55 @@ class BuildingCodeMCP:
         if path.suffix.lower() != '.pdf':
             return {"error": f"File is not a PDF: {path}"}
 
-        # Version verification: check text markers and page count
-        warning = None
-        version_issues = []
+        # Handles open on a previously connected PDF must not serve this one
+        self._documents.invalidate(code)
+        self._pdf_hashes.pop(code, None)
 
-        if PYMUPDF_AVAILABLE:
+        # Version verification: check text markers and page count. A PDF
+        # checked before (same path, size and mtime) reuses the stored result.
+        # The identity is taken before the check so a file replaced while it
+        # is being read is not stored under the new file's identity.
+        warning = None
+        identity = _file_identity(path)
+        known = self._known_verification(code, path, identity)
+        if known is not None:
+            warning = known["warning"]
+            if known.get("md5"):
+                self._pdf_hashes[code] = known["md5"]
+        elif PYMUPDF_AVAILABLE:
             try:
-                doc = fitz.open(str(path))
-                pdf_pages = len(doc)
-
-                # Check 1: Text markers (preferred method)
-                if code in VERSION_MARKERS:
-                    marker_info = VERSION_MARKERS[code]
-                    marker_page = marker_info["page"]
-                    expected_markers = marker_info["markers"]
-
-                    # Extract text from the specified page (usually first page)
-                    if marker_page < len(doc):
-                        page_text = doc[marker_page].get_text()
-
-                        # Check if all markers are present
-                        missing_markers = []
-                        for marker in expected_markers:
-                            if marker not in page_text:
-                                missing_markers.append(marker)
-
-                        if missing_markers:
-                            version_issues.append(
-                                f"Version markers not found: {missing_markers[:2]}. "
-                                f"This may not be the correct version of {code}."
-                            )
-
-                    # Check 2: Expected page count (if specified)
-                    expected_pages = marker_info.get("expected_pages")
-                    if expected_pages:
-                        page_diff = abs(pdf_pages - expected_pages)
-                        if page_diff > 50:  # Allow 50 page tolerance
-                            version_issues.append(
-                                f"Page count mismatch: PDF has {pdf_pages} pages, "
-                                f"expected ~{expected_pages} pages."
-                            )
-
-                # Check 3: Fallback - compare with map's max page
-                sections = self.maps[code].get("sections", [])
-                max_map_page = max((s.get("page", 0) for s in sections), default=0)
-
-                if pdf_pages < max_map_page:
-                    version_issues.append(
-                        f"PDF has {pdf_pages} pages, but map references page {max_map_page}."
-                    )
-
-                doc.close()
-
-                # Combine all issues into warning
-                if version_issues:
-                    warning = (
-                        f"PDF version mismatch detected for {code}:\n" +
-                        "\n".join(f"  • {issue}" for issue in version_issues) +
-                        f"\n\nText extraction may return incorrect content. "
-                        f"Please ensure you have the correct PDF version."
-                    )
-
+                with self._documents.checkout(code, str(path.absolute())) as doc:
+                    warning = _version_warning(code, _pdf_version_issues(code, doc, self._map_info[code]["max_page"]))
+                self._remember_verification(code, path, identity, warning)
             except Exception as e:
                 # If check fails, continue anyway but note the failure
                 warning = f"Could not verify PDF version: {str(e)}"
 
+        return self._connect_pdf(code, path, warning)
+
+    def _known_verification(self, code: str, path: Path, identity: Optional[tuple]) -> Optional[Dict]:
+        """Stored verification of the PDF at path for code, if the file is unchanged since."""
+        if identity is None:
+            return None
+        signature = _verification_signature(code, self._map_info[code]["max_page"])
+        return self._verifications.get(code, str(path.absolute()), identity, signature)
+
+    def _remember_verification(self, code: str, path: Path, identity: Optional[tuple], warning: Optional[str]):
+        """Store a verification result for the PDF file as it was (identity) before the check."""
+        if identity is None:
+            return
+        signature = _verification_signature(code, self._map_info[code]["max_page"])
+        self._verifications.put(code, str(path.absolute()), identity, signature, warning)
+
+    def _connect_pdf(self, code: str, path: Path, warning: Optional[str]) -> Dict:
+        """Bind a checked PDF to code; warning is None when its version was verified."""
         self.pdf_paths[code] = str(path.absolute())
         self.pdf_verified[code] = warning is None
+        indexing = self.fulltext_index and warning is None and self._schedule_fulltext_index(code, retry=True)
 
         result = {"success": True, "code": code, "path": str(path)}
+        if indexing:
+            result["indexing"] = "Full-text index building in the background (see get_index_status)"
         if warning:
             result["warning"] = warning
             result["verified"] = False
@@ -880,6 +2750,7 @@ class BuildingCodeMCP:
         connected = []
         not_matched = []
         errors = []
+        matched = []
 
         for pdf_path in pdf_files:
             filename_lower = pdf_path.stem.lower()
@@ -899,19 +2770,38 @@ class BuildingCodeMCP:
                     break
 
             if matched_code:
-                # Connect this PDF
-                result = self.set_pdf_path(matched_code, str(pdf_path))
-                if result.get("success"):
-                    connected.append({
-                        "code": matched_code,
-                        "file": pdf_path.name,
-                        "verified": result.get("verified", False)
-                    })
-                else:
-                    errors.append({"file": pdf_path.name, "error": result.get("error")})
+                matched.append((matched_code, pdf_path))
             else:
                 not_matched.append(pdf_path.name)
 
+        # Verify the PDFs in parallel, then connect them in folder order so a
+        # code matched by several files ends up with the same one every time
+        # (PDFs verified before are left to set_pdf_path's stored results)
+        identities = {pdf_path: _file_identity(pdf_path) for _, pdf_path in matched}
+        unchecked = [(code, pdf_path) for code, pdf_path in matched
+                     if self._known_verification(code, pdf_path, identities[pdf_path]) is None]
+        warnings = {}
+        # Files gone or unreadable since the glob (no identity) count as empty
+        # here and report their error from set_pdf_path
+        size = sum(identities[pdf_path][0] for _, pdf_path in unchecked if identities[pdf_path])
+        if len(unchecked) > 1 and size >= PDF_SCAN_PARALLEL_BYTES:
+            warnings = self._verify_pdf_files(unchecked, identities)
+        for matched_code, pdf_path in matched:
+            if pdf_path in warnings:
+                self._documents.invalidate(matched_code)
+                self._pdf_hashes.pop(matched_code, None)
+                result = self._connect_pdf(matched_code, pdf_path, warnings[pdf_path])
+            else:
+                result = self.set_pdf_path(matched_code, str(pdf_path))
+            if result.get("success"):
+                connected.append({
+                    "code": matched_code,
+                    "file": pdf_path.name,
+                    "verified": result.get("verified", False)
+                })
+            else:
+                errors.append({"file": pdf_path.name, "error": result.get("error")})
+
         return {
             "success": len(connected) > 0,
             "folder": str(folder),
@@ -921,6 +2811,44 @@ class BuildingCodeMCP:
             "summary": f"Connected {len(connected)} PDFs, {len(not_matched)} not matched"
         }
 
+    def _verify_pdf_files(self, matched: List[tuple],
+                          identities: Dict[Path, Optional[tuple]]) -> Dict[Path, Optional[str]]:
+        """Version-check (code, PDF path) pairs on a pool of worker processes.
+
+        Returns each checked path's set_pdf_path warning, logging files as
+        they finish; results are stored under the file identities taken
+        before the scan. PyMuPDF is not thread-safe, so the checks need processes
+        to run side by side; pairs missing from the result (no PyMuPDF, a
+        single CPU, or no process pool on this host) are left to set_pdf_path.
+        """
+        warnings: Dict[Path, Optional[str]] = {}
+        workers = min(PDF_SCAN_WORKERS, len(matched), os.cpu_count() or 1)
+        if not PYMUPDF_AVAILABLE or workers < 2:
+            return warnings
+        try:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                     initializer=_redirect_worker_stdout) as pool:
+                futures = {
+                    pool.submit(_verify_pdf_file, code, str(pdf_path.absolute()), self._map_info[code]["max_page"]):
+                        (code, pdf_path)
+                    for code, pdf_path in matched
+                }
+                for future in as_completed(futures):
+                    code, pdf_path = futures[future]
+                    try:
+                        warning = _version_warning(code, future.result())
+                        self._remember_verification(code, pdf_path, identities[pdf_path], warning)
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        warning = f"Could not verify PDF version: {str(e)}"
+                    warnings[pdf_path] = warning
+                    _log(f"Checked {pdf_path.name} for {code}: {'verified' if warning is None else 'not verified'}")
+        except (OSError, RuntimeError) as e:  # includes BrokenProcessPool
+            _log(f"Parallel PDF verification unavailable: {e}")
+        return warnings
+
     def verify_section(self, section_id: str, code: str) -> Dict:
         """Verify if a section exists and return its citation."""
         if not section_id or not isinstance(section_id, str):
@@ -938,53 +2866,44 @@ class BuildingCodeMCP:
                 "disclaimer_ref": "buildingcode://disclaimer"
             }
 
-        data = self.maps[code]
-        version = data.get("version", "unknown")
-
-        # Try exact match first, then try with Division prefixes
-        search_ids = [section_id]
-        if not section_id.startswith(('A-', 'B-', 'C-', 'Commentary-', 'Part')):
-            search_ids.extend([f'A-{section_id}', f'B-{section_id}', f'C-{section_id}'])
-
-        for section in data.get("sections", []):
-            if section.get("id") in search_ids:
-                actual_id = section.get("id")
-                page = section.get("page")
-                title = section.get("title", "")
-
-                # Build formal citation
-                citation = f"{code} {version}, Section {actual_id}"
-                if page:
-                    citation += f", Page {page}"
-
-                result = {
-                    "exists": True,
-                    "section_id": actual_id,
-                    "code": code,
-                    "version": version,
-                    "title": title,
-                    "page": page,
-                    "citation": citation,
-                    "citation_format": f"{code} {version}, s. {actual_id}" + (f", p. {page}" if page else ""),
-                    "disclaimer_ref": "buildingcode://disclaimer"
-                }
-                # Note if found with different prefix
-                if actual_id != section_id:
-                    result["note"] = f"Found as '{actual_id}' (you searched for '{section_id}')"
+        version = self._map_info[code].get("version", "unknown")
+
+        # Exact match first, then with Division prefixes (one index probe)
+        index = self._get_index(code)
+        idx = index.find(section_id)
+        if idx is not None:
+            section = index.section(idx)
+            actual_id = section.id
+            page = section.page
+            title = section.title
+
+            # Build formal citation
+            citation = f"{code} {version}, Section {actual_id}"
+            if page:
+                citation += f", Page {page}"
+
+            result = {
+                "exists": True,
+                "section_id": actual_id,
+                "code": code,
+                "version": version,
+                "title": title,
+                "page": page,
+                "citation": citation,
+                "citation_format": f"{code} {version}, s. {actual_id}" + (f", p. {page}" if page else ""),
+                "disclaimer_ref": "buildingcode://disclaimer"
+            }
+            # Note if found with different prefix
+            if actual_id != section_id:
+                result["note"] = f"Found as '{actual_id}' (you searched for '{section_id}')"
 
-                # Add mode info
-                result = self._add_mode_info(result, code)
-                return result
+            # Add mode info
+            result = self._add_mode_info(result, code)
+            return result
 
         # Section not found - suggest similar sections
-        similar = []
         section_prefix = section_id.rsplit(".", 1)[0] if "." in section_id else section_id
-        for section in data.get("sections", []):
-            sid = section.get("id", "")
-            if sid.startswith(section_prefix):
-                similar.append(sid)
-                if len(similar) >= 5:
-                    break
+        similar = index.ids_with_prefix(section_prefix, 5)
 
         return {
             "exists": False,
@@ -1016,11 +2935,11 @@ class BuildingCodeMCP:
             # Get version info if we have the map
             primary_version = "unknown"
             if primary_code in self.maps:
-                primary_version = self.maps[primary_code].get("version", "unknown")
+                primary_version = self._map_info[primary_code].get("version", "unknown")
 
             also_check_info = []
             for code in info["also_check"]:
-                version = self.maps[code].get("version", "unknown") if code in self.maps else "unknown"
+                version = self._map_info[code].get("version", "unknown") if code in self.maps else "unknown"
                 also_check_info.append({"code": code, "version": version})
 
             return {
@@ -1062,7 +2981,7 @@ class BuildingCodeMCP:
         Get a specific table by ID with markdown content.
 
         Args:
-            table_id: Table ID (e.g., "Table-4.1.5.3", "4.1.5.3")
+            table_id: Table ID (e.g., "Table-4.1.5.3", "4.1.5.3", "B-4.1.5.3", "9.10.14.4-A")
             code: Optional code name (e.g., "NBC")
 
         Returns:
@@ -1072,38 +2991,94 @@ class BuildingCodeMCP:
             return {"error": "Table ID is required"}
 
         # Normalize table ID
-        if not table_id.startswith("Table-"):
+        if not table_id.startswith("Table"):
             table_id = f"Table-{table_id}"
 
-        # Search in specified code or all codes
-        codes_to_search = [code] if code and code in self.maps else list(self.maps.keys())
-
-        for code_name in codes_to_search:
-            data = self.maps.get(code_name, {})
-            tables = data.get("tables", [])
+        # Restrict to the specified code (all codes if unknown)
+        scope = code if code and code in self.maps else None
+
+        # Global table index probes: exact ID, then without a Division
+        # prefix, then any -A/-B style suffix variants of the ID
+        key = _table_key(table_id)
+        probes = [(self._table_index, key)]
+        if key[:2] in ("a-", "b-", "c-"):
+            probes.append((self._table_index, key[2:]))
+        probes.append((self._table_variants, key))
+
+        hits = []
+        variants = False
+        for table_index, probe in probes:
+            hits = [hit for hit in table_index.get(probe, ()) if scope is None or hit[0] == scope]
+            if hits:
+                variants = table_index is self._table_variants
+                break
 
-            for table in tables:
-                if table.get("id") == table_id:
-                    version = data.get("version", "unknown")
-                    return {
-                        "id": table_id,
-                        "code": code_name,
-                        "version": version,
-                        "title": table.get("title", ""),
-                        "page": table.get("page"),
-                        "table_info": table.get("table_info", {}),
-                        "markdown": table.get("markdown", ""),
-                        "keywords": table.get("keywords", []),
-                        "citation": f"{code_name} {version}, {table.get('title', table_id)}",
-                        "disclaimer_ref": "buildingcode://disclaimer"
-                    }
+        if hits:
+            code_name, idx = hits[0]
+            table = self._get_index(code_name).tables[idx]
+            version = self._map_info[code_name].get("version", "unknown")
+            actual_id = table.get("id", table_id)
+            result = {
+                "id": actual_id,
+                "code": code_name,
+                "version": version,
+                "title": table.get("title", ""),
+                "page": table.get("page"),
+                "table_info": table.get("table_info", {}),
+                "markdown": table.get("markdown", ""),
+                "keywords": table.get("keywords", []),
+                "citation": f"{code_name} {version}, {table.get('title', actual_id)}",
+                "disclaimer_ref": "buildingcode://disclaimer"
+            }
+            if variants and len(hits) > 1:
+                result["variants"] = [
+                    self._map_info[c]["tables"][i] for c, i in hits if c == code_name
+                ]
+            return result
 
         return {
             "error": f"Table {table_id} not found",
-            "suggestion": "Use search_code to find tables, e.g., search_code('Table 4.1.5.3', 'NBC')",
+            "suggestion": "Use list_tables or search_code to find tables, e.g., search_code('Table 4.1.5.3', 'NBC')",
             "note": "Table IDs follow pattern: Table-X.X.X.X or Table-X.X.X.X-A"
         }
 
+    def list_tables(self, code: Optional[str] = None, prefix: Optional[str] = None,
+                    limit: int = 50) -> Dict:
+        """List tables by ID, optionally filtered by code and ID prefix.
+
+        Args:
+            code: Optional code name (e.g., "NBC"). If omitted, lists all codes.
+            prefix: Optional table ID prefix (e.g., "9.10", "Table-4.1")
+            limit: Max tables to return (default 50, max 200)
+        """
+        limit = max(1, min(limit, 200))
+
+        if code and code not in self.maps:
+            return {"error": f"Code not found: {code}", "tables": [], "total": 0}
+
+        key_prefix = _table_key(prefix) if prefix else ""
+        codes_to_list = [code] if code else list(self.maps.keys())
+
+        tables = []
+        total = 0
+        for code_name in codes_to_list:
+            index = self._get_index(code_name)
+            hits = index.tables_with_prefix(key_prefix)
+            total += len(hits)
+            for idx in hits:
+                if len(tables) >= limit:
+                    break
+                table = index.tables[idx]
+                item = {"id": table.get("id"), "title": table.get("title", ""), "page": table.get("page")}
+                if not code:
+                    item["code"] = code_name
+                tables.append(item)
+
+        response = {"tables": tables, "total": total}
+        if total > limit:
+            response["hint"] = f"Showing {limit}/{total}. Use prefix or limit param to narrow."
+        return response
+
     def get_page(self, code: str, page: int) -> Dict:
         """
         Get full text content of a specific page from the Building Code PDF.
@@ -1134,81 +3109,289 @@ class BuildingCodeMCP:
             }
 
         try:
-            doc = fitz.open(pdf_path)
-            total_pages = len(doc)
+            total_pages, texts = self._read_pdf_pages(code, [page])
 
             if page < 1 or page > total_pages:
-                doc.close()
                 return {"error": f"Page {page} out of range (1-{total_pages})"}
 
-            page_obj = doc[page - 1]
-            text = page_obj.get_text("text")
-            doc.close()
-
             return {
                 "code": code,
                 "page": page,
                 "total_pages": total_pages,
-                "text": text,
+                "text": texts[0],
                 "disclaimer_ref": "buildingcode://disclaimer"
             }
         except Exception as e:
             return {"error": f"Failed to read page: {str(e)}"}
 
-    def _extract_text(self, code: str, section: Dict, max_chars: int = 8000) -> Optional[str]:
-        """Extract text from PDF for a section.
+    def _read_pdf_pages(self, code: str, pages: Sequence[int], clip: Optional[tuple] = None) -> tuple:
+        """Page count and the text of 1-indexed pages of code's PDF (None if out of range).
 
-        Supports multi-page sections using page_end field.
-        Uses markdown format for better table rendering.
+        clip is the (left, bottom) of a section's bbox; the first page is then
+        cropped to the section's region.
         """
-        if not PYMUPDF_AVAILABLE:
-            return None
+        return self._read_pdf_texts(code, [(page_num, clip if i == 0 else None) for i, page_num in enumerate(pages)])
 
-        pdf_path = self.pdf_paths.get(code)
-        if not pdf_path:
-            return None
-
-        try:
-            doc = fitz.open(pdf_path)
-            page_start = section.get("page", 0)
-            page_end = section.get("page_end", page_start)  # Multi-page support
-
-            if page_start <= 0 or page_start > len(doc):
-                return None
-
-            all_text = []
+    def _read_pdf_texts(self, code: str, requests: Sequence[tuple]) -> tuple:
+        """Page count and the text for each (page, clip) of code's PDF (None if out of range).
 
-            for page_num in range(page_start, min(page_end + 1, len(doc) + 1)):
+        Texts come from the page-text cache, then the on-disk store when a
+        text cache directory is set, so repeated reads (and, with the store,
+        reads after a restart) neither open the PDF nor call PyMuPDF. Anything
+        left is extracted with one document checkout, each distinct
+        (page, clip) once.
+        """
+        pdf_path = self.pdf_paths[code]
+        digest = self._pdf_digest(code)
+        store = self._text_store(digest)
+
+        keys = [(digest, page_num, page_clip) for page_num, page_clip in requests]
+        texts = [self._page_texts.get(key) for key in keys]
+        total_pages = self._pdf_page_counts.get(digest)
+        if total_pages is None and store and store.page_count is not None:
+            total_pages = self._pdf_page_counts[digest] = store.page_count
+        missing = []
+        for i, (_, page_num, page_clip) in enumerate(keys):
+            if texts[i] is not None or (total_pages is not None and not 1 <= page_num <= total_pages):
+                continue
+            texts[i] = store.get(page_num, page_clip) if store else None
+            if texts[i] is None:
+                missing.append(i)
+            else:
+                self._page_texts.put(keys[i], texts[i])
+        if total_pages is not None and not missing:
+            return total_pages, texts
+
+        extracted: Dict[tuple, str] = {}
+        with self._documents.checkout(code, pdf_path) as doc:
+            total_pages = self._pdf_page_counts[digest] = len(doc)
+            for i in missing:
+                _, page_num, page_clip = keys[i]
+                if not 1 <= page_num <= total_pages:
+                    continue
+                if keys[i] in extracted:
+                    texts[i] = extracted[keys[i]]
+                    continue
                 page = doc[page_num - 1]
-
-                # First page: use bbox if available
-                if page_num == page_start and section.get("bbox"):
-                    bbox = section["bbox"]
+                if page_clip:
+                    left, bottom = page_clip
                     page_height = page.rect.height
-                    rect = fitz.Rect(
-                        bbox["l"],
-                        page_height - bbox["b"],
-                        page.rect.width - 50,
-                        page_height
-                    )
+                    rect = fitz.Rect(left, page_height - bottom, page.rect.width - 50, page_height)
                     text = page.get_text("text", clip=rect)
                 else:
-                    # Full page with markdown for better tables
                     text = page.get_text("text")
+                texts[i] = extracted[keys[i]] = text
+                self._page_texts.put(keys[i], text)
+                if store:
+                    store.put(page_num, page_clip, text, total_pages)
+        return total_pages, texts
+
+    def _pdf_page_count(self, code: str) -> int:
+        """Page count of code's connected PDF, from the caches when it was read before."""
+        digest = self._pdf_digest(code)
+        total_pages = self._pdf_page_counts.get(digest)
+        if total_pages is None:
+            store = self._text_store(digest)
+            if store and store.page_count is not None:
+                total_pages = store.page_count
+            else:
+                with self._documents.checkout(code, self.pdf_paths[code]) as doc:
+                    total_pages = len(doc)
+            self._pdf_page_counts[digest] = total_pages
+        return total_pages
+
+    def _pdf_digest(self, code: str) -> str:
+        """MD5 of code's connected PDF, computed once per connection."""
+        digest = self._pdf_hashes.get(code)
+        if digest is None:
+            pdf_path = Path(self.pdf_paths[code])
+            identity = _file_identity(pdf_path)
+            digest = self._pdf_hashes[code] = _file_md5(pdf_path)
+            # Stored with the verification, so a reconnect skips hashing too
+            self._verifications.set_md5(code, str(pdf_path), identity, digest)
+        return digest
+
+    def _text_store(self, digest: str) -> Optional[_PageTextStore]:
+        """On-disk page text for the PDF with this MD5 (None without a text cache dir)."""
+        if self.text_cache_dir is None:
+            return None
+        if digest not in self._text_stores:
+            with self._lock:
+                if digest not in self._text_stores:
+                    try:
+                        self.text_cache_dir.mkdir(parents=True, exist_ok=True)
+                        store = _PageTextStore(self.text_cache_dir / f"{digest}.pages")
+                    except OSError as e:
+                        _log(f"Page text cache unavailable: {e}")
+                        store = None
+                    self._text_stores[digest] = store
+        return self._text_stores[digest]
+
+    def _fulltext_codes(self, code: Optional[str]) -> tuple:
+        """([(code, full-text index)] ready to search, [codes whose index is not built yet]).
+
+        Covers code, or every code with a connected, verified PDF; missing
+        indexes are scheduled for building.
+        """
+        codes = [code] if code else list(self.pdf_paths)
+        ready, pending = [], []
+        for code_name in codes:
+            if code_name not in self.pdf_paths or not self.pdf_verified.get(code_name):
+                continue
+            fulltext = self._fulltext.get(self._fulltext_key(code_name))
+            if fulltext:
+                ready.append((code_name, fulltext))
+            else:
+                pending.append(code_name)
+                self._schedule_fulltext_index(code_name)
+        return ready, pending
+
+    def _schedule_fulltext_index(self, code: str, retry: bool = False) -> bool:
+        """Queue code's full-text index on the background worker.
+
+        False if it is already queued, or if building it from the same PDF
+        failed before and retry is not set.
+        """
+        if not PYMUPDF_AVAILABLE:
+            return False
+        return self._index_worker.submit(code, self.pdf_paths[code],
+                                         lambda progress: self._build_fulltext_index(code, progress),
+                                         retry=retry)
+
+    def _fulltext_key(self, code: str) -> tuple:
+        """Key of code's connected PDF in _fulltext: its path and file identity.
+
+        A stat instead of the MD5, so searches and status checks never hash
+        a PDF; the MD5 is only computed by the indexing worker.
+        """
+        pdf_path = self.pdf_paths[code]
+        return code, pdf_path, _file_identity(Path(pdf_path))
+
+    def _build_fulltext_index(self, code: str, progress: Optional[Callable[[int, int], Any]] = None) -> Dict:
+        """Load or build the full-text index of code's connected PDF; returns its summary.
+
+        Built indexes are saved in fulltext_dir (when set) under the PDF's
+        MD5, so each document is indexed once.
+        """
+        pdf_path = self.pdf_paths[code]
+        key = self._fulltext_key(code)
+        digest = self._pdf_digest(code)
+        index = self._get_index(code)
+        signature = _section_signature(index)
+        path = self.fulltext_dir / f"{digest}.fulltext" if self.fulltext_dir else None
+        fulltext = _FullTextIndex.load(path, code, signature, len(index.ids)) if path else None
+        loaded = fulltext is not None
+        if not loaded:
+            _log(f"Building full-text index for {code}")
+            fulltext = _FullTextIndex.build(code, index, self._pdf_words(code, pdf_path, progress))
+            if path:
+                try:
+                    self.fulltext_dir.mkdir(parents=True, exist_ok=True)
+                    fulltext.save(path)
+                except OSError as e:
+                    _log(f"Full-text index not saved: {e}")
+        self._fulltext[key] = fulltext
+        return {"sections": fulltext.documents, "terms": len(fulltext.terms), "from_cache": loaded}
+
+    def _pdf_words(self, code: str, pdf_path: str,
+                   progress: Optional[Callable[[int, int], Any]] = None) -> Iterator[tuple]:
+        """(page number, page height, words) for every page of a PDF.
+
+        The document is checked out per batch of pages, so page reads for
+        other requests are not held up for the whole document.
+        """
+        page_num, total_pages = 1, 0
+        while True:
+            batch = []
+            with self._documents.checkout(code, pdf_path) as doc:
+                total_pages = len(doc)
+                for page in doc.pages(page_num - 1, min(page_num - 1 + FULLTEXT_BATCH_PAGES, total_pages)):
+                    batch.append((page.number + 1, page.rect.height, page.get_text("words")))
+            yield from batch
+            page_num += FULLTEXT_BATCH_PAGES
+            if progress:
+                progress(min(page_num - 1, total_pages), total_pages)
+            if page_num > total_pages:
+                return
+
+    def get_index_status(self, code: Optional[str] = None, retry: bool = False) -> Dict:
+        """Full-text indexing progress of connected PDFs.
+
+        Args:
+            code: Optional code to report on (default: every connected code)
+            retry: Queue failed indexes again (a failed build is otherwise
+                only retried when its code's PDF is connected again)
+        """
+        if code and code not in self.maps:
+            return {"error": f"Code not found: {code}"}
+        indexes = {}
+        for code_name in [code] if code else sorted(self.pdf_paths):
+            if code_name not in self.pdf_paths:
+                status = {"state": "not_connected"}
+            elif not self.pdf_verified.get(code_name):
+                status = {"state": "not_indexed", "reason": "PDF version not verified"}
+            else:
+                status = self._index_worker.status(code_name)
+                if retry and status and status["state"] == "failed":
+                    self._schedule_fulltext_index(code_name, retry=True)
+                    status = self._index_worker.status(code_name)
+                built = self._fulltext_key(code_name) in self._fulltext
+                if status is None or status["state"] == "ready" and not built:
+                    status = {"state": "ready" if built else "not_indexed"}
+            if status["state"] == "indexing" and status.get("total_pages"):
+                status["percent"] = round(100 * status["pages_done"] / status["total_pages"])
+            elif status["state"] == "failed":
+                status["hint"] = "Call get_index_status with retry=true to index this PDF again"
+            indexes[code_name] = status
+
+        result = {"indexes": indexes}
+        if not indexes:
+            result["hint"] = "No PDFs connected. Use set_pdf_path first."
+        return result
 
-                if text:
-                    all_text.append(text.strip())
+    def _extract_text(self, code: str, section: _Section, max_chars: int = 8000) -> Optional[str]:
+        """Extract text from PDF for a section.
 
-            doc.close()
+        Supports multi-page sections using page_end field.
+        Uses markdown format for better table rendering.
+        """
+        if not PYMUPDF_AVAILABLE:
+            return None
 
-            combined = "\n\n".join(all_text)
-            # Limit total chars but don't cut mid-sentence
-            if len(combined) > max_chars:
-                combined = combined[:max_chars].rsplit('.', 1)[0] + '...'
+        if code not in self.pdf_paths:
+            return None
 
-            return combined if combined else None
+        try:
+            requests = self._section_pages(section, self._pdf_page_count(code))
+            if not requests:
+                return None
+            _, texts = self._read_pdf_texts(code, requests)
         except Exception as e:
             return None
+        return self._join_section_text(texts, max_chars)
+
+    def _section_pages(self, section: _Section, total_pages: int) -> List[tuple]:
+        """The (page, clip) reads that make up a section's text, up to the PDF's last page.
+
+        Empty without a page or when the section starts past the last page;
+        a section running past the end is truncated there.
+        """
+        page_start = section.page or 0
+        page_end = section.page_end if section.page_end is not None else page_start  # Multi-page support
+        if page_start <= 0:
+            return []
+        # First page: clip to the section's bbox if available
+        clip = (section.bbox["l"], section.bbox["b"]) if section.bbox else None
+        return [(page_num, clip if page_num == page_start else None)
+                for page_num in range(page_start, min(page_end, total_pages) + 1)]
+
+    @staticmethod
+    def _join_section_text(texts: Sequence[Optional[str]], max_chars: int = 8000) -> Optional[str]:
+        """Combine a section's page texts, capped at max_chars without cutting mid-sentence."""
+        combined = "\n\n".join(text.strip() for text in texts if text)
+        if len(combined) > max_chars:
+            combined = combined[:max_chars].rsplit('.', 1)[0] + '...'
+        return combined if combined else None
 
     def get_pages(self, code: str, start_page: int, end_page: int) -> Dict:
         """Read text from a range of pages.
@@ -1231,26 +3414,14 @@ class BuildingCodeMCP:
         if end_page - start_page > 4:
             return {"error": f"Maximum 5 pages per request. Requested {end_page - start_page + 1} pages."}
 
-        pdf_path = self.pdf_paths[code]
-
         try:
-            doc = fitz.open(pdf_path)
-            total_pages = len(doc)
+            page_nums = range(start_page, end_page + 1)
+            total_pages, texts = self._read_pdf_pages(code, page_nums)
 
             if start_page < 1 or end_page > total_pages or start_page > end_page:
-                doc.close()
                 return {"error": f"Invalid page range. Valid: 1-{total_pages}"}
 
-            pages_text = []
-            for page_num in range(start_page, end_page + 1):
-                page = doc[page_num - 1]
-                text = page.get_text("text")
-                pages_text.append({
-                    "page": page_num,
-                    "text": text
-                })
-
-            doc.close()
+            pages_text = [{"page": page_num, "text": text} for page_num, text in zip(page_nums, texts)]
 
             return {
                 "code": code,
@@ -1274,10 +3445,32 @@ def get_mcp() -> BuildingCodeMCP:
         maps_dir = Path(__file__).parent.parent / "maps"
         if not maps_dir.exists():
             maps_dir = Path("maps")
-        mcp_instance = BuildingCodeMCP(str(maps_dir))
+        mcp_instance = BuildingCodeMCP.from_environment(str(maps_dir))
     return mcp_instance
 
 
+# Tool calls run on worker threads so a slow call (a 5-page get_pages, an
+# all-codes search) never blocks protocol I/O for other in-flight requests.
+# PyMuPDF is not thread-safe, so calls that read a PDF share one thread.
+def _env_workers(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+TOOL_WORKERS = _env_workers("BUILDING_CODE_MCP_WORKERS", 4)
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="building-code-tool")
+_pdf_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="building-code-pdf")
+
+
+def _reads_pdf(mcp: BuildingCodeMCP, name: str, arguments: Dict[str, Any]) -> bool:
+    """Whether a tool call may open a PDF (get_section(s) only with a PDF connected)."""
+    if name in ("set_pdf_path", "get_page", "get_pages"):
+        return True
+    return name in ("get_section", "get_sections") and arguments.get("code", "") in mcp.pdf_paths
+
+
 @server.list_tools()
 async def list_tools() -> List[Tool]:
     return [
@@ -1326,6 +3519,18 @@ async def list_tools() -> List[Tool]:
                         "type": "boolean",
                         "description": "Include extra metadata (match_type, document_type, etc). Default false.",
                         "default": False
+                    },
+                    "ranking": {
+                        "type": "string",
+                        "enum": ["default", "bm25"],
+                        "description": "Result ordering. 'bm25' ranks by term rarity and title/keyword weight, so the best sections come first. Default 'default'.",
+                        "default": "default"
+                    },
+                    "scope": {
+                        "type": "string",
+                        "enum": ["map", "fulltext"],
+                        "description": "What to search. 'fulltext' searches the text of connected PDFs (finds wording not in section keywords); map results are returned until the PDF's index is built. Default 'map'.",
+                        "default": "map"
                     }
                 },
                 "required": ["query"],
@@ -1370,6 +3575,39 @@ async def list_tools() -> List[Tool]:
                 openWorldHint=False
             )
         ),
+        Tool(
+            name="get_sections",
+            description="Get several sections of one code in a single call. Prefer this over repeated get_section calls: with a PDF connected, shared pages are read only once.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "maxItems": 20,
+                        "description": "Section IDs (e.g., ['9.10.14.1', '9.10.14.2']). Maximum 20."
+                    },
+                    "code": {
+                        "type": "string",
+                        "description": "Code name (e.g., 'NBC2025', 'OBC_Vol1')"
+                    },
+                    "verbose": {
+                        "type": "boolean",
+                        "description": "Include keywords, bbox, mode_info, etc. for each section. Default false.",
+                        "default": False
+                    }
+                },
+                "required": ["ids", "code"],
+                "additionalProperties": False
+            },
+            annotations=ToolAnnotations(
+                title="Get Multiple Sections",
+                readOnlyHint=True,
+                destructiveHint=False,
+                idempotentHint=True,
+                openWorldHint=False
+            )
+        ),
         Tool(
             name="get_hierarchy",
             description="Navigate the code structure by getting parent, children, and sibling sections. Useful for understanding context and finding related requirements.",
@@ -1383,6 +3621,11 @@ async def list_tools() -> List[Tool]:
                     "code": {
                         "type": "string",
                         "description": "Code name (e.g., 'NBC', 'OBC')"
+                    },
+                    "depth": {
+                        "type": "integer",
+                        "description": "Levels of descendants to include (default 1, max 5). Use 2+ to get a whole subtree (e.g., all of 9.9) in one call.",
+                        "default": 1
                     }
                 },
                 "required": ["id", "code"],
@@ -1496,6 +3739,36 @@ async def list_tools() -> List[Tool]:
                 openWorldHint=False
             )
         ),
+        Tool(
+            name="list_tables",
+            description="List table IDs and titles, optionally filtered by code and ID prefix (e.g., '9.10' for all Part 9.10 tables). Use this to find the exact ID before get_table.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "code": {
+                        "type": "string",
+                        "description": "Optional: Code name (e.g., 'NBC', 'OBC'). If omitted, lists all codes."
+                    },
+                    "prefix": {
+                        "type": "string",
+                        "description": "Optional: Table ID prefix (e.g., '9.10', 'Table-4.1', 'A-9')"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Max tables (default 50, max 200)",
+                        "default": 50
+                    }
+                },
+                "additionalProperties": False
+            },
+            annotations=ToolAnnotations(
+                title="List Tables",
+                readOnlyHint=True,
+                destructiveHint=False,
+                idempotentHint=True,
+                openWorldHint=False
+            )
+        ),
         Tool(
             name="get_page",
             description="Get full text content of a specific page. Requires PDF to be connected via set_pdf_path. Use this when you need to see all content on a page, including tables and context around sections.",
@@ -1552,13 +3825,36 @@ async def list_tools() -> List[Tool]:
                 openWorldHint=False
             )
         ),
+        Tool(
+            name="get_index_status",
+            description="Check full-text indexing progress for connected PDFs. search_code with scope='fulltext' returns map results until a PDF's index is ready.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "code": {
+                        "type": "string",
+                        "description": "Optional code name (default: all connected codes)"
+                    },
+                    "retry": {
+                        "type": "boolean",
+                        "description": "Queue failed indexes again (default: false)"
+                    }
+                },
+                "additionalProperties": False
+            },
+            annotations=ToolAnnotations(
+                title="Get Index Status",
+                readOnlyHint=True,
+                destructiveHint=False,
+                idempotentHint=False,
+                openWorldHint=False
+            )
+        ),
     ]
 
 
-@server.call_tool()
-async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
-    mcp = get_mcp()
-
+def _run_tool(mcp: BuildingCodeMCP, name: str, arguments: Dict[str, Any]) -> str:
+    """Run one tool call synchronously and serialize its result."""
     if name == "list_codes":
         result = mcp.list_codes(arguments.get("verbose", False))
     elif name == "search_code":
@@ -1566,7 +3862,9 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
             arguments.get("query", ""),
             arguments.get("code"),
             arguments.get("limit", 10),
-            arguments.get("verbose", False)
+            arguments.get("verbose", False),
+            arguments.get("ranking", "default"),
+            arguments.get("scope", "map")
         )
     elif name == "get_section":
         result = mcp.get_section(
@@ -1574,8 +3872,18 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
             arguments.get("code", ""),
             arguments.get("verbose", False)
         )
+    elif name == "get_sections":
+        result = mcp.get_sections(
+            arguments.get("code", ""),
+            arguments.get("ids", []),
+            arguments.get("verbose", False)
+        )
     elif name == "get_hierarchy":
-        result = mcp.get_hierarchy(arguments.get("id", ""), arguments.get("code", ""))
+        result = mcp.get_hierarchy(
+            arguments.get("id", ""),
+            arguments.get("code", ""),
+            arguments.get("depth", 1)
+        )
     elif name == "set_pdf_path":
         result = mcp.set_pdf_path(arguments.get("code", ""), arguments.get("path", ""))
     elif name == "verify_section":
@@ -1584,6 +3892,12 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
         result = mcp.get_applicable_code(arguments.get("location", ""))
     elif name == "get_table":
         result = mcp.get_table(arguments.get("table_id", ""), arguments.get("code"))
+    elif name == "list_tables":
+        result = mcp.list_tables(
+            arguments.get("code"),
+            arguments.get("prefix"),
+            arguments.get("limit", 50)
+        )
     elif name == "get_page":
         result = mcp.get_page(arguments.get("code", ""), arguments.get("page", 0))
     elif name == "get_pages":
@@ -1592,10 +3906,20 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
             arguments.get("start_page", 0),
             arguments.get("end_page", 0)
         )
+    elif name == "get_index_status":
+        result = mcp.get_index_status(arguments.get("code"), arguments.get("retry", False))
     else:
         result = {"error": f"Unknown tool: {name}"}
 
-    return [TextContent(type="text", text=json.dumps(result, indent=2, ensure_ascii=False))]
+    return json.dumps(result, indent=2, ensure_ascii=False)
+
+
+@server.call_tool()
+async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
+    mcp = get_mcp()
+    executor = _pdf_executor if _reads_pdf(mcp, name, arguments) else _tool_executor
+    text = await asyncio.get_running_loop().run_in_executor(executor, _run_tool, mcp, name, arguments)
+    return [TextContent(type="text", text=text)]
 
 
 # ============================================
@@ -1765,7 +4089,7 @@ async def list_resources() -> List[Resource]:
         Resource(
             uri="buildingcode://stats",
             name="Server Statistics",
-            description="Statistics about indexed building codes and sections",
+            description="Statistics about indexed building codes and sections, and full-text indexing progress",
             mimeType="application/json"
         ),
         Resource(
@@ -1777,11 +4101,10 @@ async def list_resources() -> List[Resource]:
     ]
 
     # Add each code as a resource
-    for code in mcp.maps.keys():
-        data = mcp.maps[code]
-        doc_type = data.get("document_type", "code")
-        version = data.get("version", "unknown")
-        sections = len(data.get("sections", []))
+    for code, info in mcp._map_info.items():
+        doc_type = info.get("document_type", "code")
+        version = info.get("version", "unknown")
+        sections = info["sections"]
         resources.append(Resource(
             uri=f"buildingcode://code/{code}",
             name=f"{code} {version}",
@@ -1842,12 +4165,15 @@ async def read_resource(uri) -> str:
         return json.dumps(mcp.list_codes(), indent=2, ensure_ascii=False)
 
     elif uri_str == "buildingcode://stats":
-        total_sections = sum(len(d.get("sections", [])) for d in mcp.maps.values())
+        total_sections = sum(info["sections"] for info in mcp._map_info.values())
         stats = {
-            "total_codes": len([c for c, d in mcp.maps.items() if d.get("document_type") != "guide"]),
-            "total_guides": len([c for c, d in mcp.maps.items() if d.get("document_type") == "guide"]),
+            "total_codes": len([c for c, d in mcp._map_info.items() if d.get("document_type") != "guide"]),
+            "total_guides": len([c for c, d in mcp._map_info.items() if d.get("document_type") == "guide"]),
             "total_sections": total_sections,
-            "codes": {code: len(data.get("sections", [])) for code, data in mcp.maps.items()}
+            "codes": {code: info["sections"] for code, info in mcp._map_info.items()},
+            "fulltext_indexes": mcp.get_index_status()["indexes"],
+            "search_cache": mcp.search_cache_info(),
+            "page_text_cache": mcp.page_text_cache_info()
         }
         return json.dumps(stats, indent=2, ensure_ascii=False)
 
@@ -1857,15 +4183,16 @@ async def read_resource(uri) -> str:
     elif uri_str.startswith("buildingcode://code/"):
         code = uri_str.replace("buildingcode://code/", "")
         if code in mcp.maps:
-            data = mcp.maps[code]
+            info = mcp._map_info[code]
+            index = mcp._get_index(code)
             summary = {
                 "code": code,
-                "version": data.get("version"),
-                "document_type": data.get("document_type", "code"),
-                "total_sections": len(data.get("sections", [])),
+                "version": info.get("version"),
+                "document_type": info.get("document_type", "code"),
+                "total_sections": info["sections"],
                 "sample_sections": [
-                    {"id": s.get("id"), "title": s.get("title"), "page": s.get("page")}
-                    for s in data.get("sections", [])[:10]
+                    {"id": s.id, "title": s.title, "page": s.page}
+                    for s in (index.section(idx) for idx in range(min(10, len(index.ids))))
                 ]
             }
             return json.dumps(summary, indent=2, ensure_ascii=False)
@@ -1883,9 +4210,8 @@ async def _async_main():
 
 def main():
     """Entry point for the MCP server."""
-    import asyncio
     mcp = get_mcp()
-    total_sections = sum(len(d.get("sections", [])) for d in mcp.maps.values())
+    total_sections = sum(info["sections"] for info in mcp._map_info.values())
     _log(f"Starting server: {len(mcp.maps)} codes, {total_sections} sections indexed")
     asyncio.run(_async_main())
 
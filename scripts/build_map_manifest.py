@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Build maps/_manifest.json - per-map metadata for fast server startup.
+
+The MCP server reads the manifest to list codes, versions, section counts
+and table IDs without parsing every map; each map is then loaded on first
+use. Maps missing from the manifest (or changed since) are parsed at startup
+instead, so a stale manifest only costs speed.
+
+Usage:
+    python scripts/build_map_manifest.py
+    python scripts/build_map_manifest.py --maps-dir path/to/maps
+
+Run after regenerating or editing any maps/*.json.
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from building_code_mcp.mcp_server import build_map_manifest, _map_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the map manifest for lazy map loading")
+    parser.add_argument(
+        "--maps-dir",
+        default=str(Path(__file__).parent.parent / "maps"),
+        help="Directory containing the map JSON files (default: maps/)"
+    )
+    args = parser.parse_args()
+
+    maps_dir = Path(args.maps_dir)
+    if not _map_files(maps_dir):
+        print(f"Error: No map files found in {maps_dir}")
+        return 1
+
+    manifest_file = build_map_manifest(str(maps_dir))
+    print(f"Wrote {manifest_file} ({len(_map_files(maps_dir))} maps)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Build maps/search_index.bin - the prebuilt search index shipped with the maps.
+
+Holds every code's term dictionary, posting lists, section ID table and
+hierarchy arrays in one binary file. The MCP server memory-maps it at startup
+instead of building the indexes from maps/*.json; a code whose map no longer
+matches the MD5 recorded here falls back to indexing the JSON.
+
+Usage:
+    python scripts/build_search_index.py
+    python scripts/build_search_index.py --maps-dir path/to/maps
+
+Run after generate_map_v2.py (or any edit to maps/*.json), together with
+build_map_manifest.py.
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from building_code_mcp.mcp_server import build_search_index, _map_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the prebuilt search index for the maps")
+    parser.add_argument(
+        "--maps-dir",
+        default=str(Path(__file__).parent.parent / "maps"),
+        help="Directory containing the map JSON files (default: maps/)"
+    )
+    args = parser.parse_args()
+
+    maps_dir = Path(args.maps_dir)
+    if not _map_files(maps_dir):
+        print(f"Error: No map files found in {maps_dir}")
+        return 1
+
+    index_file = build_search_index(str(maps_dir))
+    size_mb = index_file.stat().st_size / (1024 * 1024)
+    print(f"Wrote {index_file} ({size_mb:.1f} MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
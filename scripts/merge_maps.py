@@ -23,8 +23,8 @@ def merge_maps():
     maps_dir = Path(__file__).parent.parent / "maps"
     output_file = Path(__file__).parent.parent / "combined_map.json"
 
-    # Collect all map files
-    map_files = sorted(maps_dir.glob("*.json"))
+    # Collect all map files (skip _manifest.json and other _-prefixed files)
+    map_files = sorted(f for f in maps_dir.glob("*.json") if not f.name.startswith("_"))
 
     if not map_files:
         print("Error: No map files found in maps/")
@@ -6,10 +6,14 @@ Basic tests to verify core functionality works.
 Run: pytest tests/test_smoke.py -v
 """
 
+import os
 import sys
 import json
+import time
 from pathlib import Path
 
+import pytest
+
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
@@ -78,6 +82,66 @@ class TestSearchCode:
         # Should prioritize exact matches
         assert any('9.10.14' in r['id'] for r in result['results'])
 
+    def test_limit_keeps_top_results_and_total(self):
+        """Top-k selection should return the head of the full ranking and the full count"""
+        mcp = BuildingCodeMCP('maps')
+        top = mcp.search_code('fire', limit=5)
+        more = mcp.search_code('fire', limit=50)
+
+        assert top['total'] == more['total'] > 50
+        assert top['results'] == more['results'][:5]
+
+    def test_repeated_search_served_from_cache(self):
+        """Equivalent queries should hit the result cache; reloading maps should clear it"""
+        mcp = BuildingCodeMCP('maps')
+        first = mcp.search_code('fire separation', 'NBC')
+        first['results'][0]['score'] = -1  # callers mutating results must not affect the cache
+        again = mcp.search_code('  Fire   Separation ', 'NBC')
+        reordered = mcp.search_code('separation fire FIRE', 'NBC')
+
+        info = mcp.search_cache_info()
+        assert (info['hits'], info['misses'], info['size']) == (2, 1, 1)
+        assert again['results'][0]['score'] > 0
+        assert reordered['results'] == again['results']
+
+        old_index_file = mcp._search_index
+        mcp.reload_maps()
+        assert mcp.search_cache_info()['size'] == 0
+        assert mcp.search_code('fire separation', 'NBC')['results'] == again['results']
+        if old_index_file:
+            assert old_index_file._mmap.closed
+
+    def test_vectorized_scoring_matches_python(self, monkeypatch):
+        """The NumPy scorer should rank exactly like the pure-Python fallback"""
+        pytest.importorskip("numpy")
+        mcp = BuildingCodeMCP('maps')
+        queries = [('fire separation', None), ('firre alarm', 'NBC'), ('9.10.14', 'NBC'), ('washroom', None)]
+        vectorized = [mcp.search_code(q, c, limit=20, verbose=True) for q, c in queries]
+
+        monkeypatch.setitem(globals(), 'NUMPY_AVAILABLE', False)
+        mcp = BuildingCodeMCP('maps')
+        assert [mcp.search_code(q, c, limit=20, verbose=True) for q, c in queries] == vectorized
+
+    def test_bm25_ranks_title_matches_first(self):
+        """BM25 ranking should break the 1.0 ties in favour of title matches"""
+        mcp = BuildingCodeMCP('maps')
+        default = mcp.search_code('stair width', 'NBC', limit=50)
+        result = mcp.search_code('stair width', 'NBC', limit=50, ranking='bm25')
+
+        assert result['total'] == default['total']
+        assert result['results'][0]['title'] == 'Stair Width'
+        scores = [r['score'] for r in result['results']]
+        assert scores == sorted(scores, reverse=True)
+        assert len(set(scores)) > len(set(r['score'] for r in default['results']))
+
+    def test_unknown_ranking_returns_error(self):
+        """Should reject ranking modes other than default/bm25"""
+        mcp = BuildingCodeMCP('maps')
+        result = mcp.search_code('fire', 'NBC', ranking='pagerank')
+
+        assert 'error' in result
+        assert result['total'] == 0
+
 
 class TestGetSection:
     """Test get_section functionality"""
@@ -106,6 +170,17 @@ class TestGetSection:
 
         assert 'error' in result
 
+    def test_get_sections_batch(self):
+        """Should return sections in request order and list unknown IDs"""
+        mcp = BuildingCodeMCP('maps')
+        result = mcp.get_sections('NBC', ['B-9.10.14', 'INVALID.ID', '9.10.14.1'])
+
+        assert [section['id'] for section in result['sections']] == ['B-9.10.14', mcp.get_section('9.10.14.1', 'NBC')['id']]
+        assert result['sections'][0] == mcp.get_section('B-9.10.14', 'NBC')
+        assert result['not_found'] == ['INVALID.ID']
+        assert 'error' in mcp.get_sections('NBC', ['9.10.14.1'] * 21)
+        assert 'error' in mcp.get_sections('NONEXISTENT', ['9.10.14.1'])
+
 
 class TestGetHierarchy:
     """Test get_hierarchy functionality"""
@@ -134,6 +209,17 @@ class TestGetHierarchy:
 
         assert len(result['siblings']) > 0
 
+    def test_subtree_depth(self):
+        """depth > 1 should nest descendants under each child"""
+        mcp = BuildingCodeMCP('maps')
+        result = mcp.get_hierarchy('B-9.9', 'NBC', depth=2)
+
+        assert result['children']
+        assert any(child.get('children') for child in result['children'])
+        for child in result['children']:
+            for grandchild in child.get('children', []):
+                assert grandchild['id'].startswith(child['id'] + '.')
+
     def test_invalid_section_id(self):
         """Should handle None/empty section_id"""
         mcp = BuildingCodeMCP('maps')
@@ -142,6 +228,51 @@ class TestGetHierarchy:
         assert 'error' in result
 
 
+requires_pymupdf = pytest.mark.skipif(not PYMUPDF_AVAILABLE, reason="PyMuPDF not installed")
+
+
+def make_pdf(path, label, pages=3):
+    """Write a small PDF whose pages read '<label> page <n>'."""
+    doc = fitz.open()
+    for page in range(pages):
+        doc.new_page().insert_text((72, 72), f"{label} page {page + 1}")
+    doc.save(path)
+    doc.close()
+    return str(path)
+
+
+class ByodSetup:
+    """A UGP4 PDF to connect to servers under test, and a guard against reading it."""
+
+    def __init__(self, tmp_path, monkeypatch):
+        self.tmp_path = tmp_path
+        self.monkeypatch = monkeypatch
+        self._pdf = None
+
+    def pdf(self, pages=3):
+        """Path of the PDF, written on first use with the given number of pages."""
+        if self._pdf is None:
+            self._pdf = make_pdf(self.tmp_path / 'ugp4.pdf', 'ugp4', pages)
+        return self._pdf
+
+    def connect(self, mcp, pdf=None):
+        """Bind the PDF to UGP4 on mcp and treat it as verified."""
+        mcp.set_pdf_path('UGP4', pdf or self.pdf())
+        mcp.pdf_verified['UGP4'] = True
+        return mcp
+
+    def no_pdf_access(self, mcp, reason):
+        """Fail the test if mcp opens a PDF from now on."""
+        def checkout(*args):
+            raise AssertionError(f'PDF opened {reason}')
+        self.monkeypatch.setattr(mcp._documents, 'checkout', checkout)
+
+
+@pytest.fixture
+def byod(tmp_path, monkeypatch):
+    return ByodSetup(tmp_path, monkeypatch)
+
+
 class TestSetPdfPath:
     """Test set_pdf_path functionality"""
 
@@ -166,6 +297,318 @@ class TestSetPdfPath:
 
         assert 'error' in result
 
+    @requires_pymupdf
+    def test_pdf_handles_reused_until_rebound(self, tmp_path):
+        """Page reads should share one open document; rebinding the code should drop it"""
+        pdf_paths = [make_pdf(tmp_path / 'first.pdf', 'first'), make_pdf(tmp_path / 'second.pdf', 'second')]
+
+        mcp = BuildingCodeMCP('maps')
+        mcp.set_pdf_path('UGP4', pdf_paths[0])
+        assert 'first page 2' in mcp.get_page('UGP4', 2)['text']
+        assert len(mcp.get_pages('UGP4', 1, 3)['pages']) == 3
+        assert mcp._documents.open_count() == 1
+
+        mcp.set_pdf_path('UGP4', pdf_paths[1])
+        assert 'second page 2' in mcp.get_page('UGP4', 2)['text']
+        assert mcp._documents.open_count() == 1
+
+    @requires_pymupdf
+    def test_document_pool_nesting_and_retiring(self, tmp_path):
+        """Nested checkouts over the handle budget should not hang; rebinding should close handles promptly"""
+        pdfs = [make_pdf(tmp_path / f'{name}.pdf', name) for name in ('first', 'second')]
+        pool = _DocumentPool(max_open=1)
+        with pool.checkout('NBC', pdfs[0]) as outer:
+            with pool.checkout('NFC', pdfs[1]) as inner:
+                assert len(inner) == 3
+            assert not outer.is_closed  # over budget, but closed only once its checkout ends
+        assert outer.is_closed and pool.open_count() == 1
+
+        with pool.checkout('NBC', pdfs[0]) as doc:
+            pass
+        pool.invalidate('NBC')
+        assert doc.is_closed and pool.open_count() == 0
+
+    @requires_pymupdf
+    def test_page_text_served_from_cache(self, byod):
+        """Repeated page reads should come from the page-text cache without touching the PDF"""
+        mcp = byod.connect(BuildingCodeMCP('maps'))
+        first = mcp.get_pages('UGP4', 1, 3)
+
+        byod.no_pdf_access(mcp, 'for a cached page')
+        assert mcp.get_pages('UGP4', 1, 3) == first
+        assert mcp.get_page('UGP4', 2)['text'] == first['pages'][1]['text']
+        assert 'error' in mcp.get_page('UGP4', 4)
+
+        info = mcp.page_text_cache_info()
+        assert info['hits'] == 4 and info['size'] == 3
+        assert 0 < info['weight'] <= info['maxsize']
+
+    @requires_pymupdf
+    def test_fulltext_search_finds_words_under_their_section(self, tmp_path, byod):
+        """Full-text hits should resolve to the section heading above them, and the index persist"""
+        mcp = BuildingCodeMCP('maps', text_cache_dir=str(tmp_path / 'cache'))
+        assert 'note' in mcp.search_code('wind load', code='UGP4', scope='fulltext')
+
+        # Last heading on its page: words further down that page belong to it
+        index = mcp._get_index('UGP4')
+        section = next(index.section(i) for i in range(len(index.ids) - 1, -1, -1) if index.section(i).bbox)
+        doc = fitz.open()
+        for page in range(section.page):
+            doc.new_page()
+        last = doc[section.page - 1]
+        last.insert_text((72, last.rect.height - 30), "sesquipedalian requirements apply")
+        doc.save(tmp_path / 'ugp4.pdf')
+        doc.close()
+        byod.connect(mcp, str(tmp_path / 'ugp4.pdf'))
+
+        assert not mcp._build_fulltext_index('UGP4')['from_cache']
+        result = mcp.search_code('sesquipedalian requirements', code='UGP4', scope='fulltext')
+        assert result['results'][0]['id'] == section.id
+        assert 'note' not in result
+
+        restarted = byod.connect(BuildingCodeMCP('maps', text_cache_dir=str(tmp_path / 'cache')),
+                                 str(tmp_path / 'ugp4.pdf'))
+        byod.no_pdf_access(restarted, 'for a persisted index')
+        assert restarted._build_fulltext_index('UGP4')['from_cache']
+        assert restarted.search_code('sesquipedalian requirements', code='UGP4', scope='fulltext') == result
+
+    @requires_pymupdf
+    def test_fulltext_index_persisted_without_cache_dir(self, tmp_path, monkeypatch, byod):
+        """The server's default settings should keep built indexes, and rebuild a damaged one"""
+        monkeypatch.delenv('BUILDING_CODE_MCP_CACHE_DIR', raising=False)
+        monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'user-cache'))
+        monkeypatch.setenv('LOCALAPPDATA', str(tmp_path / 'user-cache'))
+        monkeypatch.setattr(Path, 'home', lambda: tmp_path / 'home')
+
+        def build():
+            return byod.connect(BuildingCodeMCP.from_environment('maps'))._build_fulltext_index('UGP4')
+
+        assert not build()['from_cache']
+        assert build()['from_cache']
+
+        saved = next(tmp_path.rglob('*.fulltext'))
+        saved.write_bytes(saved.read_bytes()[:-8])
+        assert not build()['from_cache']
+        assert build()['from_cache']
+
+    @requires_pymupdf
+    def test_fulltext_index_built_in_background(self, monkeypatch, byod):
+        """A full-text search should queue indexing and fall back to the map until it is done"""
+        mcp = byod.connect(BuildingCodeMCP('maps'), byod.pdf(pages=40))
+        assert mcp.get_index_status('UGP4')['indexes']['UGP4']['state'] == 'not_indexed'
+
+        result = mcp.search_code('ugp4 page', code='UGP4', scope='fulltext')
+        assert 'Showing map results' in result['note']
+
+        deadline = time.time() + 30
+        while mcp.get_index_status('UGP4')['indexes']['UGP4']['state'] in ('queued', 'indexing'):
+            assert time.time() < deadline
+            time.sleep(0.05)
+        status = mcp.get_index_status()['indexes']['UGP4']
+        assert status['state'] == 'ready'
+        assert status['pages_done'] == status['total_pages'] == 40
+        assert 'note' not in mcp.search_code('ugp4 page', code='UGP4', scope='fulltext')
+
+        # Status checks and searches find the index without hashing the PDF
+        def no_hashing(path):
+            raise AssertionError('PDF hashed outside the indexing worker')
+        monkeypatch.setitem(globals(), '_file_md5', no_hashing)
+        mcp._pdf_hashes.clear()
+        assert mcp.get_index_status('UGP4')['indexes']['UGP4']['state'] == 'ready'
+        assert 'note' not in mcp.search_code('second page', code='UGP4', scope='fulltext')
+
+    @requires_pymupdf
+    def test_failed_fulltext_index_not_requeued(self, monkeypatch, byod):
+        """A failed index build should only run again when a retry is asked for"""
+        mcp = byod.connect(BuildingCodeMCP('maps'))
+        builds = []
+
+        def failing_build(code, progress=None):
+            builds.append(code)
+            raise RuntimeError('damaged PDF')
+        monkeypatch.setattr(mcp, '_build_fulltext_index', failing_build)
+
+        def settled(**kwargs):
+            deadline = time.time() + 30
+            while True:
+                status = mcp.get_index_status('UGP4', **kwargs)['indexes']['UGP4']
+                kwargs = {}
+                if status['state'] not in ('queued', 'indexing'):
+                    return status
+                assert time.time() < deadline
+                time.sleep(0.05)
+
+        mcp.search_code('ugp4 page', code='UGP4', scope='fulltext')
+        assert settled()['state'] == 'failed'
+        for _ in range(3):
+            mcp.search_code('ugp4 page', code='UGP4', scope='fulltext')
+        assert settled()['error'] == 'damaged PDF'
+        assert builds == ['UGP4']
+
+        assert settled(retry=True)['state'] == 'failed'
+        assert builds == ['UGP4', 'UGP4']
+
+    @requires_pymupdf
+    def test_folder_scan_matches_single_file_checks(self, tmp_path, monkeypatch):
+        """Worker-process checks of a folder should connect PDFs as set_pdf_path would"""
+        make_pdf(tmp_path / 'nbc2025.pdf', 'nbc')
+        make_pdf(tmp_path / 'ugp4.pdf', 'ugp4')
+        make_pdf(tmp_path / 'notes.pdf', 'notes')
+        single = BuildingCodeMCP('maps')
+        expected = {code: single.set_pdf_path(code, str(tmp_path / name))
+                    for code, name in [('NBC', 'nbc2025.pdf'), ('UGP4', 'ugp4.pdf')]}
+        for code, result in expected.items():
+            issues = _verify_pdf_file(code, single.pdf_paths[code], single._map_info[code]['max_page'])
+            assert _version_warning(code, issues) == result['warning']
+
+        # Run the pool even on a single-CPU host
+        monkeypatch.setattr(os, 'cpu_count', lambda: 4)
+        monkeypatch.setitem(globals(), 'PDF_SCAN_PARALLEL_BYTES', 0)
+        pooled = BuildingCodeMCP('maps')
+        matched = [('NBC', tmp_path / 'nbc2025.pdf'), ('UGP4', tmp_path / 'ugp4.pdf')]
+        warnings = pooled._verify_pdf_files(matched, {path: _file_identity(path) for _, path in matched})
+        assert warnings == {path: expected[code]['warning'] for code, path in matched}
+
+        mcp = BuildingCodeMCP('maps')
+        result = mcp.set_pdf_path('', str(tmp_path))
+        assert sorted(entry['code'] for entry in result['connected']) == ['NBC', 'UGP4']
+        assert result['not_matched'] == ['notes.pdf']
+        assert mcp.pdf_paths == single.pdf_paths
+        assert mcp.pdf_verified == single.pdf_verified
+
+    @requires_pymupdf
+    def test_folder_scan_tolerates_unreadable_file(self, tmp_path):
+        """A PDF that cannot be read any more should be reported, not fail the whole scan"""
+        make_pdf(tmp_path / 'ugp4.pdf', 'ugp4')
+        (tmp_path / 'nbc2025.pdf').symlink_to(tmp_path / 'deleted.pdf')
+
+        result = BuildingCodeMCP('maps').set_pdf_path('', str(tmp_path))
+        assert [entry['code'] for entry in result['connected']] == ['UGP4']
+        assert [entry['file'] for entry in result['errors']] == ['nbc2025.pdf']
+
+    @requires_pymupdf
+    def test_verification_reused_for_unchanged_pdf(self, tmp_path, byod):
+        """Reconnecting an unchanged PDF should reuse the stored check; a modified one is rechecked"""
+        pdf = byod.pdf()
+        first = BuildingCodeMCP('maps', text_cache_dir=str(tmp_path / 'cache'))
+        connected = first.set_pdf_path('UGP4', pdf)
+        first.get_page('UGP4', 1)
+
+        restarted = BuildingCodeMCP('maps', text_cache_dir=str(tmp_path / 'cache'))
+        byod.no_pdf_access(restarted, 'to re-verify an unchanged file')
+        assert restarted.set_pdf_path('UGP4', pdf) == connected
+        assert restarted._pdf_hashes['UGP4'] == first._pdf_hashes['UGP4']
+
+        os.utime(pdf, ns=(time.time_ns(), time.time_ns() + 10**9))
+        assert 'Could not verify' in restarted.set_pdf_path('UGP4', pdf)['warning']
+
+    @requires_pymupdf
+    def test_verification_store_validates_entries(self, tmp_path, byod):
+        """Malformed stored entries are dropped; results are keyed by the file as it was before the check"""
+        pdf = byod.pdf()
+        store = tmp_path / 'pdf_verification.json'
+        store.write_text(json.dumps({'format': PDF_VERIFICATION_FORMAT, 'entries': {
+            'UGP4': {pdf: {'size': 'large', 'warning': None}}, 'NBC': []}}))
+        mcp = BuildingCodeMCP('maps', verification_file=str(store))
+        before = _file_identity(Path(pdf))
+
+        checkout = mcp._documents.checkout
+        def touching_checkout(code, path):
+            os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+            return checkout(code, path)
+        mcp._documents.checkout = touching_checkout
+        assert mcp.set_pdf_path('UGP4', pdf)['success']
+
+        entry = json.loads(store.read_text())['entries']['UGP4'][pdf]
+        assert (entry['size'], entry['mtime_ns']) == before != _file_identity(Path(pdf))
+
+    def test_verification_store_merges_other_processes(self, tmp_path):
+        """Saving should keep entries another process wrote since this one loaded the file"""
+        path = tmp_path / 'pdf_verification.json'
+        first, second = _VerificationStore(path), _VerificationStore(path)
+        assert first.get('UGP4', 'a.pdf', (1, 1), 'sig') is None
+        assert second.get('NBC', 'b.pdf', (2, 2), 'sig') is None
+
+        first.put('UGP4', 'a.pdf', (1, 1), 'sig', None)
+        second.put('NBC', 'b.pdf', (2, 2), 'sig', 'Could not verify')
+        second.set_md5('NBC', 'b.pdf', (2, 2), 'abc')
+
+        entries = json.loads(path.read_text())['entries']
+        assert entries['UGP4']['a.pdf']['warning'] is None
+        assert entries['NBC']['b.pdf']['md5'] == 'abc'
+        assert _VerificationStore(path).get('UGP4', 'a.pdf', (1, 1), 'sig')
+
+    @requires_pymupdf
+    def test_get_sections_reads_pdf_once(self, byod):
+        """A batch should open the PDF once and match section-by-section text"""
+        byod.pdf(pages=25)
+        single = byod.connect(BuildingCodeMCP('maps'))
+        ids = single._get_index('UGP4').ids[:8]
+
+        mcp = byod.connect(BuildingCodeMCP('maps'))
+        mcp._pdf_page_count('UGP4')  # sections are capped at the last page, read once per PDF
+        checkouts = []
+        checkout = mcp._documents.checkout
+        mcp._documents.checkout = lambda *args: checkouts.append(args) or checkout(*args)
+
+        result = mcp.get_sections('UGP4', list(ids))
+        assert len(checkouts) == 1
+        assert result['sections'] == [single.get_section(section_id, 'UGP4') for section_id in ids]
+
+    @requires_pymupdf
+    def test_section_past_last_page_is_truncated(self, byod):
+        """A section whose page range runs past the PDF's end should get the pages that exist"""
+        mcp = byod.connect(BuildingCodeMCP('maps'))
+        section = _Section('4.1.1', 'Overrun', 2, 10**6, 'section', 'section', None, [])
+
+        assert mcp._section_pages(section, mcp._pdf_page_count('UGP4')) == [(2, None), (3, None)]
+        assert mcp._extract_text('UGP4', section) == 'ugp4 page 2\n\nugp4 page 3'
+
+    @requires_pymupdf
+    def test_page_text_persisted_to_cache_dir(self, tmp_path, byod):
+        """Page text extracted once should be served from the cache dir after a restart"""
+        mcp = byod.connect(BuildingCodeMCP('maps', text_cache_dir=str(tmp_path / 'cache')))
+        first = mcp.get_pages('UGP4', 1, 3)
+        clipped = mcp._read_pdf_pages('UGP4', [2], clip=(0, 800))
+
+        restarted = byod.connect(BuildingCodeMCP('maps', text_cache_dir=str(tmp_path / 'cache')))
+        byod.no_pdf_access(restarted, 'for a persisted page')
+        assert restarted.get_pages('UGP4', 1, 3) == first
+        assert restarted._read_pdf_pages('UGP4', [2], clip=(0, 800)) == clipped
+        assert 'error' in restarted.get_page('UGP4', 4)
+
+    def test_page_text_store_drops_partial_records(self, tmp_path, monkeypatch):
+        """Short writes should be cut back off, and a truncated trailing record ignored"""
+        path = tmp_path / 'doc.pages'
+        store = _PageTextStore(path)
+        store.put(1, None, 'first page', 3)
+
+        real_write = os.write
+        monkeypatch.setattr(os, 'write', lambda fd, data: real_write(fd, data[:10]))
+        size = path.stat().st_size
+        store.put(2, None, 'second page', 3)
+        assert path.stat().st_size == size
+        monkeypatch.undo()
+
+        record = _PAGE_TEXT_RECORD.pack(2, math.nan, math.nan, 64) + b'\x78\x9c'
+        with open(path, 'ab') as f:
+            f.write(record)
+        restarted = _PageTextStore(path)
+        assert restarted.get(1, None) == 'first page'
+        assert restarted.get(2, None) is None
+
+    @requires_pymupdf
+    def test_page_text_appended_by_another_process_is_found(self, tmp_path, byod):
+        """Pages another server adds to a shared cache dir should be read from it, not the PDF"""
+        mcp = byod.connect(BuildingCodeMCP('maps', text_cache_dir=str(tmp_path / 'cache')))
+        mcp.get_page('UGP4', 1)
+
+        other = byod.connect(BuildingCodeMCP('maps', text_cache_dir=str(tmp_path / 'cache')))
+        page = other.get_page('UGP4', 2)
+
+        byod.no_pdf_access(mcp, 'for a page in the shared cache')
+        assert mcp.get_page('UGP4', 2) == page
+
 
 class TestDataQuality:
     """Test data quality in maps"""
@@ -245,6 +688,39 @@ class TestFuzzySearch:
         # Just ensure no crash
         assert 'results' in result
 
+    def test_typo_resolves_through_vocabulary(self):
+        """A typo should match sections via fuzzy vocabulary expansion"""
+        mcp = BuildingCodeMCP('maps')
+        if not FUZZY_AVAILABLE:
+            return
+
+        result = mcp.search_code('sprinklr', 'NBC', verbose=True)
+
+        assert result['total'] > 0
+        assert all(r['match_type'] == 'fuzzy' for r in result['results'])
+
+    def test_did_you_mean_suggestion(self):
+        """Zero-result searches should suggest close keywords from the cached vocabulary"""
+        mcp = BuildingCodeMCP('maps')
+        if not FUZZY_AVAILABLE:
+            return
+
+        assert 'sprinkler' in mcp._suggest_similar_keywords('sprinklr', 'NBC')
+        assert 'NBC' in mcp._suggesters
+
+    def test_suggestions_match_full_vocabulary_scan(self):
+        """Suggestions should be those of a fuzzy match over the whole vocabulary"""
+        mcp = BuildingCodeMCP('maps')
+        if not FUZZY_AVAILABLE:
+            return
+
+        for query, code in [('9.10.14', 'NFC'), ('qwerty', 'QPC'), ('handrail', 'NFC'),
+                            ('sprinklr', None), ('firewal', None), ('stair', 'OBC_Vol1')]:
+            suggestions = mcp._suggest_similar_keywords(query, code)
+            vocabulary = mcp._suggesters[code].terms
+            expected = [match[0] for match in process.extract(query, vocabulary, limit=3, score_cutoff=60)]
+            assert suggestions == expected, query
+
     def test_match_type_returned(self):
         """Results should include match_type indicator"""
         mcp = BuildingCodeMCP('maps')
@@ -419,6 +895,181 @@ class TestMultipleCodeSearch:
                     assert 'note' in r
 
 
+class TestTables:
+    """Test get_table and list_tables"""
+
+    def test_table_id_variants(self):
+        """Table IDs should resolve with or without Table-/Division prefixes"""
+        mcp = BuildingCodeMCP('maps')
+
+        for table_id in ('Table-4.1.5.3', '4.1.5.3', 'Table 4.1.5.3', 'B-4.1.5.3'):
+            result = mcp.get_table(table_id, 'NBC')
+            assert result.get('id') == 'Table-4.1.5.3', table_id
+
+    def test_list_tables_prefix(self):
+        """list_tables should only return tables under the prefix"""
+        mcp = BuildingCodeMCP('maps')
+        result = mcp.list_tables('NBC', '9.10')
+
+        assert result['total'] > 0
+        assert all(t['id'].startswith('Table-9.10') for t in result['tables'])
+
+
+class TestSearchIndex:
+    """Test the inverted index behind search_code"""
+
+    def test_postings_point_to_matching_sections(self):
+        """Every section in a posting list should contain the term"""
+        mcp = BuildingCodeMCP('maps')
+        index = mcp._get_index('NBC')
+
+        sections = mcp.maps['NBC']['sections']
+        for idx in index.postings['stair']:
+            section = sections[idx]
+            terms = set(kw.lower() for kw in section.get('keywords', []))
+            terms.update(section['title'].lower().split())
+            assert 'stair' in terms
+
+    def test_section_records_are_normalized(self):
+        """Precomputed section records should hold lowercase frozen term sets"""
+        mcp = BuildingCodeMCP('maps')
+        index = mcp._get_index('NBC')
+
+        for idx, section in enumerate(mcp.maps['NBC']['sections'][:200]):
+            record = index.record(idx)
+            assert isinstance(record.terms, frozenset)
+            assert record.keywords == {kw.lower() for kw in section.get('keywords', [])}
+            assert record.id_lower == section['id'].lower()
+            assert record.terms == record.keywords | record.title_terms
+
+    def test_sections_read_back_from_columns(self):
+        """Sections rebuilt from the index columns should match the map"""
+        mcp = BuildingCodeMCP('maps')
+        index = mcp._get_index('NBC')
+
+        for idx, section in enumerate(mcp.maps['NBC']['sections']):
+            compact = index.section(idx)
+            assert compact.id == section['id']
+            assert compact.title == section['title']
+            assert compact.page == section.get('page')
+            assert compact.page_end == section.get('page_end')
+            assert compact.bbox == section.get('bbox')
+            assert compact.keywords == section.get('keywords', [])
+
+    def test_terms_interned_across_codes(self):
+        """Codes should share one term table and store term IDs as 16-bit arrays"""
+        mcp = BuildingCodeMCP('maps')
+        nbc = mcp._get_index('NBC')
+        obc = mcp._get_index('OBC_Vol1')
+
+        assert nbc.terms is obc.terms
+        assert memoryview(nbc.columns.kw_items).format == 'H'
+        tid = mcp._term_table().ids['stair']
+        assert list(nbc.postings.run(tid)) == list(nbc.postings['stair'])
+
+    def test_id_index_resolves_bare_ids(self):
+        """Bare IDs should resolve to their Division-prefixed section"""
+        mcp = BuildingCodeMCP('maps')
+        index = mcp._get_index('NBC')
+
+        idx = index.find('9.10.14.1')
+        assert idx is not None
+        assert index.ids[idx] == 'B-9.10.14.1'
+        assert index.find('B-9.10.14.1') == idx
+        assert index.find('99.99.99.99') is None
+
+    def test_id_match_scores_suffix_higher(self):
+        """IDs ending with the query should outrank IDs merely containing it"""
+        mcp = BuildingCodeMCP('maps')
+        result = mcp.search_code('9.10.14', 'NBC', limit=50)
+
+        top = result['results'][0]
+        assert top['id'].endswith('9.10.14')
+        assert top['score'] == 2.0
+
+
+class TestLazyLoading:
+    """Test manifest-driven, on-demand map loading"""
+
+    def test_maps_parsed_on_first_use(self):
+        """Startup and list_codes should not parse maps; a search indexes only its code"""
+        mcp = BuildingCodeMCP('maps')
+        assert 'NBC' in mcp.maps
+        assert not any(mcp.maps.is_loaded(code) for code in mcp.maps)
+
+        result = mcp.list_codes()
+        assert result['total'] == len(mcp.maps)
+        assert not any(mcp.maps.is_loaded(code) for code in mcp.maps)
+
+        mcp.search_code('stair', 'NBC')
+        assert list(mcp._indexes) == ['NBC']
+
+    def test_concurrent_first_use(self):
+        """Tool calls on worker threads should build each index once and rank as serial calls do"""
+        queries = ['fire', 'stairs', 'egress', 'garage', 'handrail', 'sprinkler', 'smoke alarm', 'concrete']
+        mcp = BuildingCodeMCP('maps')
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            concurrent = list(pool.map(lambda q: mcp.search_code(q, limit=5), queries))
+            indexes = list(pool.map(mcp._get_index, ['NBC'] * 8))
+
+        assert all(index is indexes[0] for index in indexes)
+        serial = BuildingCodeMCP('maps')
+        assert concurrent == [serial.search_code(q, limit=5) for q in queries]
+
+    def test_concurrent_search_history(self):
+        """Searches and section reads on several threads should share the search history safely"""
+        mcp = BuildingCodeMCP('maps')
+        words = ['fire', 'stairs', 'egress', 'garage', 'handrail', 'sprinkler', 'smoke', 'concrete']
+
+        def call(i):
+            if i % 3 == 0:
+                return mcp.get_section('9.10.14.1', 'NBC')
+            return mcp.search_code(f"{words[i % 8]} {words[(i * 5) % 8]} {i}", code='NBC', limit=2)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # switch threads often enough to interleave the history updates
+        try:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                results = list(pool.map(call, range(400)))
+        finally:
+            sys.setswitchinterval(interval)
+        assert all('error' not in result for result in results)
+
+    def test_prebuilt_index_serves_sections_without_json(self):
+        """With a current search_index.bin, sections come from the mapped file"""
+        mcp = BuildingCodeMCP('maps')
+        assert mcp._search_index is not None
+
+        result = mcp.get_section('9.10.14.1', 'NBC', verbose=True)
+        assert result['id'] == 'B-9.10.14.1'
+        assert 'bbox' in result
+        assert mcp.get_table('4.1.5.3', 'NBC')['markdown']
+        assert not any(mcp.maps.is_loaded(code) for code in mcp.maps)
+
+    def test_stale_manifest_falls_back_to_parsing(self, tmp_path):
+        """A map that changed since the manifest was built should be parsed at startup"""
+        import shutil
+        shutil.copy(Path('maps') / 'UGP4_2020.json', tmp_path)
+        build_map_manifest(str(tmp_path))
+        with open(tmp_path / 'UGP4_2020.json', 'a', encoding='utf-8') as f:
+            f.write('\n')
+
+        mcp = BuildingCodeMCP(str(tmp_path))
+        assert list(mcp.maps) == ['UGP4']
+        assert mcp.maps.is_loaded('UGP4')
+        assert mcp.list_codes()['guides'][0]['sections'] == len(mcp.maps['UGP4']['sections'])
+
+    def test_same_size_edit_invalidates_manifest(self, tmp_path):
+        """A map edited in place without changing its size should not be served from the manifest"""
+        text = (Path('maps') / 'UGP4_2020.json').read_text(encoding='utf-8')
+        (tmp_path / 'UGP4_2020.json').write_text(text, encoding='utf-8')
+        build_map_manifest(str(tmp_path))
+        (tmp_path / 'UGP4_2020.json').write_text(text.replace('"2020"', '"2021"', 1), encoding='utf-8')
+
+        mcp = BuildingCodeMCP(str(tmp_path))
+        assert mcp.maps.is_loaded('UGP4')
+        assert mcp._map_info['UGP4']['version'] == '2021'
+
+
 if __name__ == '__main__':
     import pytest
     pytest.main([__file__, '-v'])